@@ -0,0 +1,96 @@
+import numpy as np
+from typing import NamedTuple
+from .VoteStore import VoteStore, NO_VOTE
+
+
+class SubjectStats(NamedTuple):
+    subject_id: int
+    votes: int
+    mean_tier: float  # Average tier index, 0 is the top tier
+    spread: float  # Standard deviation of the tier indexes, the controversy score
+    consensus: float  # Share of votes on the most picked tier
+    top_tier: str  # Most picked tier
+
+
+class VoterStats(NamedTuple):
+    voter_id: int
+    votes: int
+    bias: float  # Average tiers below the room's mean for the same subject, negative is generous
+    agreement: float  # Share of votes matching other voters on the same subject
+
+
+class SessionAnalytics(NamedTuple):
+    subjects: list[SubjectStats]
+    voters: list[VoterStats]
+    agreement: float  # Share of all voter pairs on a subject that picked the same tier
+    total_votes: int
+
+
+def vote_matrix(store: VoteStore) -> np.ndarray:
+    # (subjects, voters) tier indexes, NO_VOTE where nobody voted
+    # Copied straight out of the store's buffer, the store stays free to grow afterwards
+    n_subjects, n_voters = len(store.subjects), len(store.voters)
+    if not n_subjects or not n_voters:
+        return np.full((n_subjects, n_voters), NO_VOTE, dtype=np.int8)
+    return np.frombuffer(store.matrix, dtype=np.int8).reshape(n_subjects, -1)[:, :n_voters].copy()
+
+
+def analyze(store: VoteStore) -> SessionAnalytics:
+    matrix = vote_matrix(store)
+    voted = matrix != NO_VOTE
+    tiers = np.where(voted, matrix, 0).astype(np.float64)
+
+    # Subjects
+    subject_votes = voted.sum(axis=1)
+    per_subject = np.maximum(subject_votes, 1)
+    mean = tiers.sum(axis=1) / per_subject
+    deviation = np.where(voted, tiers - mean[:, None], 0.0)
+    spread = np.sqrt((deviation ** 2).sum(axis=1) / per_subject)
+    # (tiers, subjects, voters) one-hot planes, reused for the pairwise agreement below
+    planes = [(matrix == t).astype(np.float32) for t in range(len(store.tiers))]
+    counts = np.stack([plane.sum(axis=1) for plane in planes], axis=1) if planes else np.zeros((len(matrix), 0))
+    modal = counts.argmax(axis=1) if counts.size else np.zeros(len(matrix), dtype=int)
+    consensus = (counts.max(axis=1) if counts.size else np.zeros(len(matrix))) / per_subject
+
+    # Voters: pairs that voted on the same subject, and how many of those picked the same tier
+    voter_votes = voted.sum(axis=0)
+    bias = deviation.sum(axis=0) / np.maximum(voter_votes, 1)
+    presence = voted.astype(np.float32)
+    together = presence.T @ presence
+    same = sum((plane.T @ plane for plane in planes), np.zeros_like(together))
+    np.fill_diagonal(together, 0)
+    np.fill_diagonal(same, 0)
+    agreement = same.sum(axis=1) / np.maximum(together.sum(axis=1), 1)
+
+    subjects = [SubjectStats(store.subjects[i], int(subject_votes[i]), float(mean[i]), float(spread[i]),
+                             float(consensus[i]), store.tiers[int(modal[i])]) for i in range(len(store.subjects))]
+    voters = [VoterStats(store.voters[i], int(voter_votes[i]), float(bias[i]), float(agreement[i]))
+              for i in range(len(store.voters))]
+    total_together = together.sum()
+    return SessionAnalytics(subjects, voters, float(same.sum() / total_together) if total_together else 0.0, int(voted.sum()))
+
+
+def analytics_fields(analytics: SessionAnalytics, top: int = 3, min_votes: int = 2) -> list[tuple[str, str]]:
+    # (name, value) pairs for embed fields, users are shown as mentions
+    subjects = [s for s in analytics.subjects if s.votes >= min_votes]
+    voters = [v for v in analytics.voters if v.votes >= min_votes]
+    if not subjects:
+        return []
+    fields = [("Agreement", f"{analytics.agreement:.0%} of voter pairs picked the same tier ({analytics.total_votes} votes)")]
+
+    controversial = sorted(subjects, key=lambda s: s.spread, reverse=True)[:top]
+    fields.append(("Most controversial", "\n".join(
+        f"<@{s.subject_id}> spread {s.spread:.2f} tiers" for s in controversial)))
+    agreed = sorted(subjects, key=lambda s: (s.consensus, -s.spread), reverse=True)[:top]
+    fields.append(("Most agreed", "\n".join(
+        f"<@{s.subject_id}> {s.consensus:.0%} on {s.top_tier}" for s in agreed)))
+
+    if voters:
+        by_bias = sorted(voters, key=lambda v: v.bias)
+        fields.append(("Most generous voters", "\n".join(
+            f"<@{v.voter_id}> {v.bias:+.2f} tiers" for v in by_bias[:top])))
+        fields.append(("Harshest voters", "\n".join(
+            f"<@{v.voter_id}> {v.bias:+.2f} tiers" for v in reversed(by_bias[-top:]))))
+        fields.append(("Most in tune voters", "\n".join(
+            f"<@{v.voter_id}> {v.agreement:.0%}" for v in sorted(voters, key=lambda v: v.agreement, reverse=True)[:top])))
+    return fields
@@ -0,0 +1,116 @@
+import os
+import threading
+from multiprocessing.managers import BaseManager
+
+
+worker_id = int(os.environ.get("TIERVOTER_WORKER_ID", 0))  # Which shard worker this process is, 0 when not sharded
+workers = int(os.environ.get("TIERVOTER_WORKERS", 1))
+shard_count = int(os.environ.get("TIERVOTER_SHARD_COUNT", workers))
+
+
+def worker_for_guild(guild_id: int) -> int:
+    # Same split as run_shard_workers: worker w runs shards w, w + workers, ...
+    return ((guild_id >> 22) % shard_count) % workers
+
+
+class Coordinator:
+    # Cross-worker state: which worker runs a session in each channel, the workers' latest stats,
+    # and button clicks handed from one worker to another (DM clicks all arrive on shard 0)
+    # Lives in this process when not sharded, otherwise in the launcher and is reached through a manager proxy
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._forwarded = threading.Condition(self._lock)
+        self.channels: dict[int, int] = {}  # {channel id: worker id}
+        self.sessions: dict[int, int] = {}  # {session id: channel id}
+        self.inboxes: dict[int, list[dict]] = {}  # {worker id: forwarded clicks}
+        self.worker_stats: dict[int, dict] = {}
+
+    def claim(self, channel_id: int, worker: int) -> bool:
+        with self._lock:
+            owner = self.channels.setdefault(channel_id, worker)
+            return owner == worker
+
+    def release(self, channel_id: int, worker: int):
+        with self._lock:
+            if self.channels.get(channel_id) == worker:
+                self._drop_channel(channel_id)
+
+    def attach(self, session_id: int, channel_id: int):
+        # The session running in a claimed channel, so its DM clicks can find the worker
+        with self._lock:
+            self.sessions[session_id] = channel_id
+
+    def session_owner(self, session_id: int) -> int | None:
+        with self._lock:
+            return self.channels.get(self.sessions.get(session_id))
+
+    def forward(self, worker: int, click: dict):
+        with self._lock:
+            self.inboxes.setdefault(worker, []).append(click)
+            self._forwarded.notify_all()
+
+    def take_forwarded(self, worker: int, timeout: float) -> list[dict]:
+        # Blocks until clicks arrive for the worker or the timeout passes
+        with self._lock:
+            if not self.inboxes.get(worker):
+                self._forwarded.wait(timeout)
+            return self.inboxes.pop(worker, [])
+
+    def drop_worker(self, worker: int):
+        # A worker exited, its sessions went with it
+        with self._lock:
+            for channel_id in [c for c, w in self.channels.items() if w == worker]:
+                self._drop_channel(channel_id)
+            self.inboxes.pop(worker, None)
+            self.worker_stats.pop(worker, None)
+
+    def _drop_channel(self, channel_id: int):
+        del self.channels[channel_id]
+        for session_id in [s for s, c in self.sessions.items() if c == channel_id]:
+            del self.sessions[session_id]
+
+    def report(self, worker: int, stats: dict):
+        with self._lock:
+            self.worker_stats[worker] = stats
+
+    def stats(self) -> dict:
+        with self._lock:
+            totals = {}
+            for stats in self.worker_stats.values():
+                for key, value in stats.items():
+                    totals[key] = totals.get(key, 0) + value
+            return {"workers": dict(self.worker_stats), "totals": totals, "channels": len(self.channels)}
+
+
+_served = Coordinator()
+
+
+def _get_served() -> Coordinator:
+    return _served
+
+
+class CoordinatorManager(BaseManager):
+    pass
+
+
+CoordinatorManager.register("coordinator", callable=_get_served)
+
+
+def serve(authkey: bytes) -> CoordinatorManager:
+    # Started by the launcher in sharded mode, workers connect() to manager.address
+    manager = CoordinatorManager(address=("127.0.0.1", 0), authkey=authkey)
+    manager.start()
+    return manager
+
+
+def connect(address: str, authkey: bytes) -> Coordinator:
+    host, port = address.rsplit(":", 1)
+    manager = CoordinatorManager(address=(host, int(port)), authkey=authkey)
+    manager.connect()
+    return manager.coordinator()
+
+
+if "TIERVOTER_COORDINATOR" in os.environ:
+    coordinator = connect(os.environ["TIERVOTER_COORDINATOR"], bytes.fromhex(os.environ["TIERVOTER_COORDINATOR_KEY"]))
+else:
+    coordinator = Coordinator()
@@ -0,0 +1,117 @@
+import asyncio
+import discord
+from .Views.Base import parse_component_id
+from .VoteControl import VoteControl, reply, defer
+from .SessionManager import session_manager
+from .SessionStore import session_store
+from .Coordinator import coordinator, worker_id, workers, worker_for_guild
+from .Metrics import metrics
+
+
+class ForwardedResponse:
+    def is_done(self) -> bool:
+        return True  # The receiving worker deferred it before forwarding
+
+
+class ForwardedInteraction:
+    # A click another shard worker received and deferred, answered through the interaction's followup webhook
+    def __init__(self, client: discord.Client, click: dict):
+        self.client = client
+        self.data = {"custom_id": click["custom_id"]}
+        self.application_id = click["application_id"]
+        self.token = click["token"]  # Kept so the click can be forwarded again if its session moved
+        self.user = client.get_user(click["user_id"]) or discord.Object(click["user_id"])
+        self.guild = None
+        self.channel = None
+        self.response = ForwardedResponse()
+        self.followup = discord.Webhook.from_state(
+            data={"id": click["application_id"], "type": 3, "token": click["token"]}, state=client._connection)
+
+
+class ComponentDispatcher:
+    # The one component listener of the process: every session's buttons are routed here by custom id,
+    # so no View stays registered per message or per round, and buttons keep working after a restart
+    def __init__(self):
+        self._restoring: dict[int, asyncio.Task] = {}  # {session id: restore in progress}, one per session
+
+    async def dispatch(self, interaction: discord.Interaction) -> bool:
+        # False if the interaction is not one of ours
+        parsed = parse_component_id((interaction.data or {}).get("custom_id", ""))
+        if parsed is None:
+            return False
+        session_id, round, action = parsed
+        metrics.inc("components_dispatched_total")
+
+        session = session_manager.find(session_id)
+        if session is None and interaction.guild is None and workers > 1:
+            # The host's control panel is a DM and Discord sends every DM click to shard 0,
+            # hand it to the worker running the session, or the one whose shards have its guild
+            owner = await asyncio.to_thread(coordinator.session_owner, session_id)
+            if owner is None:
+                guild_id = await asyncio.to_thread(session_store.find_guild, session_id)
+                owner = worker_for_guild(guild_id) if guild_id is not None else worker_id
+            if owner != worker_id:
+                await self._forward(interaction, owner)
+                return True
+        if session is None:
+            # Restoring reads the store and fetches messages, which can outlast the 3s to answer a click
+            await defer(interaction)
+            task = self._restoring.get(session_id)
+            if task is None:
+                task = self._restoring[session_id] = asyncio.create_task(self._restore(interaction, session_id))
+                task.add_done_callback(lambda _: self._restoring.pop(session_id, None))
+            session = await task
+        if session is None:
+            await reply(interaction, "This tier list vote is no longer running.")
+            return True
+
+        await session.on_component(interaction, round, action)
+        return True
+
+    async def _forward(self, interaction: discord.Interaction, worker: int):
+        await defer(interaction)
+        metrics.inc("components_forwarded_total")
+        await asyncio.to_thread(coordinator.forward, worker, {
+            "custom_id": interaction.data["custom_id"],
+            "user_id": interaction.user.id,
+            "application_id": interaction.application_id,
+            "token": interaction.token,
+        })
+
+    async def receive_forwarded(self, client: discord.Client):
+        # Sharded mode: runs the clicks other workers handed to this one
+        while True:
+            clicks = await asyncio.to_thread(coordinator.take_forwarded, worker_id, 5.0)
+            for click in clicks:
+                asyncio.create_task(self._dispatch_forwarded(client, click))
+
+    async def _dispatch_forwarded(self, client: discord.Client, click: dict):
+        try:
+            await self.dispatch(ForwardedInteraction(client, click))
+        except Exception as e:
+            print("Forwarded click failed:", e)
+
+    async def _restore(self, interaction: discord.Interaction, session_id: int) -> VoteControl | None:
+        # A click on a session this process does not know: it ran before a restart or was evicted while idle
+        saved = await asyncio.to_thread(session_store.load_session, session_id)
+        if saved is None or saved["phase"] == "ended":
+            return None
+        client = interaction.client
+        try:
+            channel = client.get_channel(saved["channel_id"]) or await client.fetch_channel(saved["channel_id"])
+        except discord.HTTPException:
+            return None
+        if channel.id in VoteControl.channel or not await asyncio.to_thread(coordinator.claim, channel.id, worker_id):
+            return None  # Another session took the channel, or another shard worker runs this one
+        host = channel.guild.get_member(saved["host_id"])
+        if host is None:
+            try:
+                host = await channel.guild.fetch_member(saved["host_id"])
+            except discord.HTTPException:
+                await asyncio.to_thread(coordinator.release, channel.id, worker_id)
+                return None
+        metrics.inc("sessions_restored_total")
+        return await VoteControl.restore(channel, host, saved)
+
+
+component_dispatcher = ComponentDispatcher()
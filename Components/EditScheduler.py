@@ -0,0 +1,66 @@
+import os
+import asyncio
+import discord
+from .Metrics import metrics
+
+
+default_edit_interval = float(os.environ.get("TIERVOTER_EDIT_INTERVAL", 1.0))  # Seconds between edits of one message
+
+
+class EditScheduler:
+    # Coalesces edits of a single message: pending kwargs are merged latest-wins
+    # and sent at most once per min_interval, phase changes use flush() to skip the wait
+    def __init__(self, message: discord.Message, min_interval: float = default_edit_interval):
+        self.message = message
+        self.min_interval = min_interval
+        self._pending: dict = {}
+        self._last_edit = 0.0
+        self._task: asyncio.Task = None
+        self._lock = asyncio.Lock()  # Keeps edits of the message in order
+        self._queued = False  # Counted in the edit_queue_depth gauge
+
+    def request(self, **kwargs):
+        if self._pending:
+            metrics.inc("edits_coalesced_total")
+        elif not self._queued:
+            self._queued = True
+            metrics.add("edit_queue_depth", 1)
+        self._pending.update(kwargs)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        # Keeps going while requests arrive during an edit, otherwise they would wait for the next click
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            while (delay := self._last_edit + self.min_interval - loop.time()) > 0:
+                await asyncio.sleep(delay)
+            try:
+                await self._send()
+            except discord.HTTPException as e:
+                print("Scheduled edit failed:", e)
+
+    async def _send(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            kwargs, self._pending = self._pending, {}
+            if self._queued:
+                self._queued = False
+                metrics.add("edit_queue_depth", -1)
+            metrics.inc("edits_sent_total")
+            self._last_edit = asyncio.get_running_loop().time()
+            await self.message.edit(**kwargs)
+
+    async def flush(self, **kwargs):
+        # Sends everything pending right away, a sleeping scheduled edit then finds nothing to do
+        self._pending.update(kwargs)
+        await self._send()
+
+    def cancel(self):
+        self._pending.clear()
+        if self._queued:
+            self._queued = False
+            metrics.add("edit_queue_depth", -1)
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
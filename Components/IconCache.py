@@ -0,0 +1,179 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image
+from .Metrics import metrics
+
+
+class IconCache:
+    # Resized RGBA tiles keyed by (url, size), shared by every renderer in the process
+    # Hot tiles live in memory, everything else on disk as raw RGBA so a hit skips decoding
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024, memory_bytes: int = 32 * 1024 * 1024, negative_ttl: float = 300):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.negative_ttl = negative_ttl
+
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, Image.Image] = OrderedDict()  # {key: tile}, least recently used first
+        self._memory_size = 0
+        self._disk: OrderedDict[str, int] = None  # {key: file size}, loaded by load_index()
+        self._disk_size = 0
+        self._negative: dict[str, float] = {}  # {url: expiry} for downloads that failed recently
+
+    @staticmethod
+    def _key(url: str, size: int) -> str:
+        return hashlib.sha256(f"{size}:{url}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".rgba")
+
+    def load_index(self):
+        # Rebuild the disk LRU from file mtimes, which get touched on every hit
+        # Walks the whole directory without holding the lock, prewarm() runs it off the event loop at startup
+        if self._disk is not None:
+            return
+        entries = []
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not name.endswith(".rgba"):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        entries.sort()
+        with self._lock:
+            if self._disk is None:
+                self._disk = OrderedDict((key, size) for _, key, size in entries)
+                self._disk_size = sum(self._disk.values())
+
+    def _remember(self, key: str, tile: Image.Image):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = tile
+        self._memory_size += len(tile.getbands()) * tile.width * tile.height
+        while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+            _, old = self._memory.popitem(last=False)
+            self._memory_size -= len(old.getbands()) * old.width * old.height
+
+    def contains(self, url: str, size: int) -> bool:
+        # Index lookup, or a single stat before the index is loaded, cheap enough to call from the event loop
+        key = self._key(url, size)
+        with self._lock:
+            if key in self._memory or (self._disk is not None and key in self._disk):
+                return True
+        # Other processes sharing the directory may have written it since the index was built
+        return os.path.exists(self._path(key))
+
+    def get(self, url: str, size: int) -> Image.Image | None:
+        key = self._key(url, size)
+        with self._lock:
+            tile = self._memory.get(key)
+            if tile is not None:
+                self._memory.move_to_end(key)
+                metrics.inc("icon_cache_hits_total", level="memory")
+                return tile
+
+        # File I/O stays outside the lock so contains() on the event loop never waits on a disk read
+        self.load_index()
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Never cached, or evicted by another process sharing the directory
+            with self._lock:
+                self._disk_size -= self._disk.pop(key, 0)
+            metrics.inc("icon_cache_misses_total")
+            return None
+        tile = Image.frombytes("RGBA", (size, size), data)
+
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = len(data)
+                self._disk_size += len(data)
+            self._disk.move_to_end(key)
+            self._remember(key, tile)
+        metrics.inc("icon_cache_hits_total", level="disk")
+        return tile
+
+    def put(self, url: str, size: int, tile: Image.Image):
+        key = self._key(url, size)
+        tile = tile.convert("RGBA")
+        data = tile.tobytes()
+        path = self._path(key)
+        self.load_index()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # Atomic, readers never see half a tile
+
+        evicted = []
+        with self._lock:
+            self._negative.pop(url, None)
+            self._remember(key, tile)
+            self._disk_size += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            while self._disk_size > self.max_bytes and len(self._disk) > 1:
+                old_key, old_size = self._disk.popitem(last=False)
+                self._disk_size -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def put_negative(self, url: str):
+        with self._lock:
+            self._negative[url] = time.monotonic() + self.negative_ttl
+
+    def is_negative(self, url: str) -> bool:
+        with self._lock:
+            expiry = self._negative.get(url)
+            if expiry is None:
+                return False
+            if expiry < time.monotonic():
+                del self._negative[url]
+                return False
+            return True
+
+    def clear(self):
+        self.load_index()
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            self._negative.clear()
+            keys = list(self._disk)
+            self._disk.clear()
+            self._disk_size = 0
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict[str, int]:
+        self.load_index()
+        with self._lock:
+            return {
+                "memory_tiles": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_tiles": len(self._disk),
+                "disk_bytes": self._disk_size,
+                "negative": len(self._negative),
+            }
+
+
+icon_cache = IconCache(
+    directory=os.environ.get("TIERVOTER_ICON_CACHE", os.path.join(".cache", "icons")),
+    max_bytes=int(os.environ.get("TIERVOTER_ICON_CACHE_BYTES", 256 * 1024 * 1024)),
+)
@@ -0,0 +1,57 @@
+import asyncio
+import aiohttp
+from .Metrics import metrics
+
+
+class IconFetcher:
+    # Shared by every renderer in the process so the HTTP connection pool is reused
+    def __init__(self, max_concurrency: int = 8, timeout: float = 5):
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: aiohttp.ClientSession = None
+        self._semaphore: asyncio.Semaphore = None
+        self._inflight: dict[str, asyncio.Future] = {}  # {url: future} for requests already on the wire
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # The session has to be created inside the running loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def _download(self, url: str) -> bytes | None:
+        session = self._get_session()
+        async with self._semaphore:
+            metrics.inc("icon_fetches_total")  # Requests actually sent, callers sharing one in flight are not counted
+            with metrics.time("icon_fetch_seconds"):
+                try:
+                    async with session.get(url) as response:
+                        response.raise_for_status()
+                        return await response.read()
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    metrics.inc("icon_fetch_failures_total")
+                    return None
+
+    async def fetch(self, url: str) -> bytes | None:
+        # Callers asking for the same url while it is being downloaded share one request
+        if url in self._inflight:
+            return await asyncio.shield(self._inflight[url])
+
+        task = asyncio.ensure_future(self._download(url))
+        self._inflight[url] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._inflight.pop(url, None)
+            else:
+                task.add_done_callback(lambda _: self._inflight.pop(url, None))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+icon_fetcher = IconFetcher()
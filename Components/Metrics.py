@@ -0,0 +1,209 @@
+import os
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+from functools import wraps
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Timer:
+    __slots__ = ("registry", "key", "start")
+
+    def __init__(self, registry: "MetricsRegistry", key: tuple):
+        self.registry = registry
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry._histogram(self.key).observe(time.perf_counter() - self.start)
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class MetricsRegistry:
+    # Counters, gauges and latency histograms for the whole process
+    # Every recording method returns straight away when disabled, so call sites need no guards
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.counters: dict[tuple, float] = {}
+        self.gauges: dict[tuple, float] = {}
+        self.histograms: dict[tuple, Histogram] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, *sorted(labels.items()))
+
+    def _histogram(self, key: tuple) -> Histogram:
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        return histogram
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        self.gauges[self._key(name, labels)] = value
+
+    def add(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self.gauges[key] = self.gauges.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        self._histogram(self._key(name, labels)).observe(value)
+
+    def time(self, name: str, **labels):
+        # with metrics.time("render_seconds"): ...
+        if not self.enabled:
+            return _NOOP_TIMER
+        return _Timer(self, self._key(name, labels))
+
+    def timed(self, name: str, **labels):
+        # Decorator for coroutines, decided once at import so a disabled registry costs nothing per call
+        def decorator(func):
+            if not self.enabled:
+                return func
+
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.time(name, **labels):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    """EXPORT"""
+    @staticmethod
+    def _format_key(key: tuple, extra: dict = None) -> str:
+        name, *labels = key
+        labels = [*labels, *(extra or {}).items()]
+        if not labels:
+            return name
+        return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": {self._format_key(k): v for k, v in self.counters.items()},
+            "gauges": {self._format_key(k): v for k, v in self.gauges.items()},
+            "histograms": {
+                self._format_key(k): {"count": h.count, "sum": h.sum, "p50": h.quantile(0.5), "p99": h.quantile(0.99)}
+                for k, h in self.histograms.items()
+            },
+        }
+
+    def render_text(self) -> str:
+        # Prometheus text exposition format
+        lines = []
+        for key, value in sorted(self.counters.items()):
+            lines.append(f"{self._format_key(key)} {value}")
+        for key, value in sorted(self.gauges.items()):
+            lines.append(f"{self._format_key(key)} {value}")
+        for key, histogram in sorted(self.histograms.items()):
+            name = key[0]
+            seen = 0
+            for bound, n in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                seen += n
+                le = "+Inf" if bound == float("inf") else bound
+                lines.append(f"{self._format_key((name + '_bucket', *key[1:]), {'le': le})} {seen}")
+            lines.append(f"{self._format_key((name + '_count', *key[1:]))} {histogram.count}")
+            lines.append(f"{self._format_key((name + '_sum', *key[1:]))} {histogram.sum}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        # Short human readable digest for the admin command
+        lines = []
+        for key, value in sorted(self.counters.items()):
+            lines.append(f"{self._format_key(key)}: {value:g}")
+        for key, value in sorted(self.gauges.items()):
+            lines.append(f"{self._format_key(key)}: {value:g}")
+        for key, h in sorted(self.histograms.items()):
+            lines.append(f"{self._format_key(key)}: n={h.count} avg={h.sum / h.count * 1000 if h.count else 0:.1f}ms "
+                         f"p50<={h.quantile(0.5) * 1000:g}ms p99<={h.quantile(0.99) * 1000:g}ms")
+        return "\n".join(lines) or "No metrics recorded yet."
+
+
+metrics = MetricsRegistry(enabled=os.environ.get("TIERVOTER_METRICS", "0") == "1")
+
+
+async def monitor_loop_lag(interval: float = 0.25):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        metrics.observe("event_loop_lag_seconds", max(0.0, loop.time() - start - interval))
+
+
+async def start_metrics_server(port: int = None):
+    # Local-only HTTP endpoint, /metrics in Prometheus text format and /metrics.json
+    if not metrics.enabled:
+        return None
+    from aiohttp import web
+
+    async def text(request):
+        return web.Response(text=metrics.render_text(), content_type="text/plain")
+
+    async def json_snapshot(request):
+        return web.json_response(metrics.snapshot())
+
+    app = web.Application()
+    app.router.add_get("/metrics", text)
+    app.router.add_get("/metrics.json", json_snapshot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port or int(os.environ.get("TIERVOTER_METRICS_PORT", 9108)))
+    await site.start()
+    asyncio.create_task(monitor_loop_lag())
+    return runner
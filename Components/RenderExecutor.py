@@ -0,0 +1,63 @@
+import io
+import os
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from .Metrics import metrics
+from .TemplateRenderer import TemplateRenderer, EncodeProfile, FINAL_ENCODING, render_snapshot, render_snapshot_tiles, warm_up
+
+
+class RenderExecutor:
+    # Runs TemplateRenderer work off the event loop
+    # "thread" reuses the session renderer (and its decoded icons), "process" sidesteps the GIL
+    def __init__(self, mode: str = "thread", max_workers: int = None):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown render executor mode: {mode}")
+        self.mode = mode
+        self.max_workers = max_workers
+        self._pool: Executor = None
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tierboard-render")
+        return self._pool
+
+    async def render(self, renderer: TemplateRenderer, encoding: EncodeProfile = FINAL_ENCODING) -> io.BytesIO:
+        # The snapshot is taken on the loop, so votes arriving during the render don't race it
+        snapshot = renderer.snapshot()
+        loop = asyncio.get_running_loop()
+        # Includes time queued behind other sessions' renders, process workers keep their own render metrics
+        with metrics.time("render_job_seconds", mode=self.mode):
+            if self.mode == "process":
+                data = await loop.run_in_executor(self._get_pool(), render_snapshot, snapshot, encoding)
+                return io.BytesIO(data)
+            return await loop.run_in_executor(self._get_pool(), renderer.render, snapshot, encoding)
+
+    async def render_tiles(self, renderer: TemplateRenderer, encoding: EncodeProfile = FINAL_ENCODING) -> list[io.BytesIO]:
+        # One image unless the board is over the renderer's pixel budget, see TemplateRenderer.render_tiles
+        snapshot = renderer.snapshot()
+        loop = asyncio.get_running_loop()
+        with metrics.time("render_job_seconds", mode=self.mode):
+            if self.mode == "process":
+                tiles = await loop.run_in_executor(self._get_pool(), render_snapshot_tiles, snapshot, encoding)
+                return [io.BytesIO(data) for data in tiles]
+            return await loop.run_in_executor(self._get_pool(), renderer.render_tiles, snapshot, encoding)
+
+    async def warm_up(self, tiers: list[str]):
+        # Starts the pool and loads fonts where renders will run, process workers included
+        loop = asyncio.get_running_loop()
+        with metrics.time("render_warm_up_seconds", mode=self.mode):
+            await loop.run_in_executor(self._get_pool(), warm_up, tiers)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+render_executor = RenderExecutor(
+    mode=os.environ.get("TIERVOTER_RENDER_MODE", "thread"),
+    max_workers=int(os.environ["TIERVOTER_RENDER_WORKERS"]) if "TIERVOTER_RENDER_WORKERS" in os.environ else None,
+)
@@ -0,0 +1,73 @@
+import os
+import time
+import asyncio
+from .Metrics import metrics
+
+
+class SessionManager:
+    # Owns every live VoteControl (VoteControl.channel is this dict) and evicts the ones nobody touched for idle_ttl
+    # Evicted sessions stay in the session store, /voteresume brings them back
+    def __init__(self, idle_ttl: float = 6 * 3600, sweep_interval: float = 60):
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.sessions: dict[int, "VoteControl"] = {}  # {channel id: session}
+        self.by_id: dict[int, "VoteControl"] = {}  # {session id: session}, kept by VoteControl for the dispatcher
+        self.evicted = 0
+        self._sweeper: asyncio.Task = None
+
+    def find(self, session_id: int) -> "VoteControl | None":
+        return self.by_id.get(session_id)
+
+    def idle(self, now: float = None) -> list["VoteControl"]:
+        now = time.monotonic() if now is None else now
+        return [session for session in self.sessions.values() if now - session.lastActive > self.idle_ttl]
+
+    async def sweep(self) -> int:
+        idle = self.idle()
+        for session in idle:
+            try:
+                await session.evict()
+            except Exception as e:
+                print("Session eviction failed:", e)
+                self.sessions.pop(session.PublicChannel.id, None)
+                self.by_id.pop(session.sessionId, None)
+        self.evicted += len(idle)
+        metrics.inc("sessions_evicted_total", len(idle))
+        self.stats()
+        return len(idle)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            await self.sweep()
+
+    def start(self):
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    def stats(self) -> dict:
+        sessions = list(self.sessions.values())
+        totals = {
+            "sessions": len(sessions),
+            "tasks": sum(len(session._tasks) for session in sessions),
+            "queued_votes": sum(session.voteQueue.qsize() for session in sessions),
+            "memory_bytes": sum(session.nbytes() for session in sessions),
+            "evicted": self.evicted,
+        }
+        metrics.set("sessions_active", totals["sessions"])
+        metrics.set("session_tasks", totals["tasks"])
+        metrics.set("session_memory_bytes", totals["memory_bytes"])
+        return totals
+
+    def summary(self) -> str:
+        totals = self.stats()
+        lines = [f"Sessions: {totals['sessions']} | Tasks: {totals['tasks']} | Queued votes: {totals['queued_votes']} | "
+                 f"Memory: ~{totals['memory_bytes'] / 1024:.0f} KiB | Evicted: {totals['evicted']}"]
+        now = time.monotonic()
+        for channel_id, session in self.sessions.items():
+            lines.append(f"#{channel_id}: {session.status} idle {now - session.lastActive:.0f}s, "
+                         f"{len(session._tasks)} tasks, ~{session.nbytes() / 1024:.0f} KiB")
+        return "\n".join(lines)
+
+
+session_manager = SessionManager(idle_ttl=float(os.environ.get("TIERVOTER_SESSION_TTL", 6 * 3600)))
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,             -- snowflake-like id, also part of every button's custom id
+    channel_id INTEGER NOT NULL,
+    guild_id INTEGER,
+    host_id INTEGER NOT NULL,
+    tiers TEXT NOT NULL,                -- JSON list
+    status TEXT NOT NULL,
+    phase TEXT NOT NULL DEFAULT 'registration',  -- registration, voting, ended
+    private_message_id INTEGER,
+    public_message_id INTEGER,
+    board_message_id INTEGER,
+    stage_user_id INTEGER,
+    round INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_channel ON sessions (channel_id, phase);
+CREATE TABLE IF NOT EXISTS participants (
+    session_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    position INTEGER,                   -- voting order, NULL until the vote starts
+    PRIMARY KEY (session_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS votes (
+    session_id INTEGER NOT NULL,
+    subject_id INTEGER NOT NULL,
+    voter_id INTEGER NOT NULL,
+    tier TEXT NOT NULL,
+    PRIMARY KEY (session_id, subject_id, voter_id)
+);
+CREATE TABLE IF NOT EXISTS items (
+    session_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    PRIMARY KEY (session_id, position)
+);
+"""
+
+SESSION_FIELDS = ("status", "phase", "private_message_id", "public_message_id", "board_message_id", "stage_user_id", "round")
+
+
+class SessionStore:
+    # Persists VoteControl state so a session survives a restart
+    # Writes are queued and committed by one writer thread in periodic batches, so callers never wait on disk
+    def __init__(self, path: str, flush_interval: float = 0.5, max_batch: int = 1000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._writer: threading.Thread = None
+        self._start_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._start_lock:
+            if self._writer is None:
+                conn = self._connect()
+                conn.executescript(SCHEMA)
+                conn.commit()
+                self._writer = threading.Thread(target=self._write_loop, args=(conn,), name="session-store-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self, conn: sqlite3.Connection):
+        while True:
+            op = self._queue.get()
+            batch = [op]
+            deadline = time.monotonic() + self.flush_interval
+            # Keep collecting until the interval is up, so a burst of votes costs one transaction
+            while len(batch) < self.max_batch and op is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    op = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(op)
+
+            ops = [op for op in batch if op is not None and not isinstance(op, threading.Event)]
+            try:
+                with conn:
+                    for sql, params in ops:
+                        conn.execute(sql, params)
+            except sqlite3.Error as e:
+                print("Session store write failed:", e)
+            for op in batch:
+                if isinstance(op, threading.Event):
+                    op.set()
+            if None in batch:
+                conn.close()
+                return
+
+    def _write(self, sql: str, params: tuple = ()):
+        self._ensure_writer()
+        self._queue.put((sql, params))
+
+    def flush(self, timeout: float = None) -> bool:
+        # Blocks until everything queued so far is committed, call it off the event loop
+        self._ensure_writer()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    """WRITES"""
+    def create_session(self, session_id: int, channel_id: int, guild_id: int, host_id: int, tiers: list[str], status: str):
+        self._write(
+            "INSERT OR REPLACE INTO sessions (id, channel_id, guild_id, host_id, tiers, status, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (session_id, channel_id, guild_id, host_id, json.dumps(tiers), status, time.time()))
+
+    def update_session(self, session_id: int, **fields):
+        unknown = set(fields) - set(SESSION_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown session fields: {', '.join(sorted(unknown))}")
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self._write(f"UPDATE sessions SET {columns}, updated_at = ? WHERE id = ?", (*fields.values(), time.time(), session_id))
+
+    def add_participant(self, session_id: int, user_id: int):
+        self._write("INSERT OR IGNORE INTO participants (session_id, user_id) VALUES (?, ?)", (session_id, user_id))
+
+    def set_order(self, session_id: int, order: list[int]):
+        for position, user_id in enumerate(order):
+            self._write("UPDATE participants SET position = ? WHERE session_id = ? AND user_id = ?", (position, session_id, user_id))
+
+    def record_vote(self, session_id: int, subject_id: int, voter_id: int, tier: str):
+        self._write("INSERT OR REPLACE INTO votes (session_id, subject_id, voter_id, tier) VALUES (?, ?, ?, ?)",
+                    (session_id, subject_id, voter_id, tier))
+
+    def add_item(self, session_id: int, position: int, user_id: int, url: str, tier: str):
+        self._write("INSERT OR REPLACE INTO items (session_id, position, user_id, url, tier) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, position, user_id, url, tier))
+
+    def end_session(self, session_id: int):
+        self.update_session(session_id, phase="ended", status="Voting completed.")
+
+    """READS"""
+    def load_session(self, session_id: int) -> dict | None:
+        # Blocking, call it off the event loop
+        self.flush()
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            session = dict(row)
+            session["tiers"] = json.loads(session["tiers"])
+            participants = conn.execute(
+                "SELECT user_id, position FROM participants WHERE session_id = ? ORDER BY position, rowid", (session_id,)).fetchall()
+            session["participants"] = [p["user_id"] for p in participants]
+            session["order"] = [p["user_id"] for p in participants if p["position"] is not None]
+            session["votes"] = [tuple(v) for v in conn.execute(
+                "SELECT subject_id, voter_id, tier FROM votes WHERE session_id = ?", (session_id,))]
+            session["items"] = [dict(i) for i in conn.execute(
+                "SELECT position, user_id, url, tier FROM items WHERE session_id = ? ORDER BY position", (session_id,))]
+            return session
+        finally:
+            conn.close()
+
+    def find_active(self, channel_id: int) -> int | None:
+        self.flush()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT id FROM sessions WHERE channel_id = ? AND phase != 'ended' ORDER BY updated_at DESC LIMIT 1",
+                (channel_id,)).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+
+    def find_guild(self, session_id: int) -> int | None:
+        self.flush()
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT guild_id FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def find_sessions(self, phase: str = None, channel_id: int = None) -> list[int]:
+        # Every session id, oldest first, optionally only those in one phase or channel
+        self.flush()
+        conn = self._connect()
+        try:
+            where = [(column, value) for column, value in (("phase", phase), ("channel_id", channel_id)) if value is not None]
+            sql = "SELECT id FROM sessions"
+            if where:
+                sql += " WHERE " + " AND ".join(f"{column} = ?" for column, _ in where)
+            rows = conn.execute(sql + " ORDER BY updated_at", tuple(value for _, value in where)).fetchall()
+            return [row[0] for row in rows]
+        finally:
+            conn.close()
+
+
+session_store = SessionStore(os.environ.get("TIERVOTER_DB", "tiervoter.db"))
@@ -1,114 +1,467 @@
 import io
+import os
 import math
-import requests
-from PIL import Image, ImageDraw, ImageFont, ImageShow
+import asyncio
+import threading
+from typing import NamedTuple
+from PIL import Image, ImageDraw, ImageFont
 import colorsys
+from .IconFetcher import icon_fetcher
+from .IconCache import icon_cache
+from .Metrics import metrics
+
+
+class RenderSnapshot(NamedTuple):
+    # Immutable copy of what a render needs, safe to hand to another thread or process
+    tiers: tuple[str, ...]
+    items: tuple[tuple[str, str], ...]  # ((url, tier), ...)
+
+
+class EncodeProfile(NamedTuple):
+    format: str = "PNG"  # PNG or WEBP
+    mode: str = "RGB"  # The board is opaque, RGBA only adds bytes
+    compress_level: int = 6  # PNG zlib level, lower is faster
+    palette_colors: int = 0  # Quantize to this many colours before a PNG encode, 0 keeps full colour
+    lossless: bool = True  # WEBP only
+    quality: int = 80  # WEBP only, lossy quality or lossless effort
+    method: int = 4  # WEBP only, 0 (fast) to 6 (small)
+
+    @property
+    def extension(self) -> str:
+        return self.format.lower()
+
+
+LIVE_ENCODING = EncodeProfile(format="WEBP", lossless=False, quality=80, method=0)  # Per round updates, fast and small
+FINAL_ENCODING = EncodeProfile(format="PNG", compress_level=9)  # Final board, lossless
+
+
+class PixelBudget(NamedTuple):
+    max_pixels: int = 4_000_000  # Per image, the RGB canvas takes 3 bytes a pixel
+    max_aspect: float = 2.0  # Height / width, tall boards get more columns before smaller icons
+    min_item_size: int = 32
+    max_columns: int = 40
+
+
+class BoardLayout(NamedTuple):
+    item_size: int
+    columns: int
+    width: int
+    height: int
+
+
+def plan_layout(counts: list[int], item_size: int, columns: int, label_width: int, budget: PixelBudget = None) -> BoardLayout:
+    # Largest icons, then fewest columns, whose board fits the budget; the smallest board if nothing does
+    def measure(cell: int, cols: int) -> BoardLayout:
+        rows = sum(max(1, math.ceil(n / cols)) for n in counts)
+        return BoardLayout(cell, cols, label_width + cols * cell, rows * cell)
+
+    if budget is None:
+        return measure(item_size, columns)
+    smallest = None
+    cells = [*range(item_size, budget.min_item_size, -8), budget.min_item_size]
+    for cell in cells:
+        for cols in range(columns, max(columns, budget.max_columns) + 1):
+            layout = measure(cell, cols)
+            pixels = layout.width * layout.height
+            if pixels <= budget.max_pixels and layout.height <= budget.max_aspect * layout.width:
+                return layout
+            if smallest is None or pixels < smallest.width * smallest.height:
+                smallest = layout
+    return smallest
+
+
+max_pixels = int(os.environ.get("TIERVOTER_RENDER_MAX_PIXELS", 4_000_000))
+default_budget = PixelBudget(max_pixels=max_pixels) if max_pixels > 0 else None  # 0 keeps the fixed 80px, 10 column layout
+
+
+def tier_colors(tiers: list[str]) -> dict[str, tuple[int, int, int]]:
+    n = len(tiers)
+    colors = {}
+    for i in range(n):
+        hue = i/n
+        lightness = 0.4
+        saturation = 0.9
+        
+        colors[tiers[i]] = tuple(int(c * 255) for c in colorsys.hls_to_rgb(hue, lightness, saturation))
+    return colors
+
+
+class TierLayout:
+    # Everything about a board that only depends on its tiers and sizes: font, colours and label tiles
+    def __init__(self, tiers: tuple[str, ...], font_path: str, font_size: int, label_width: int):
+        self.font_size = font_size
+        self.label_width = label_width
+        self.font = ImageFont.truetype(font_path, font_size)
+        self.colors = tier_colors(list(tiers))
+        self.labels: dict[str, tuple[Image.Image, int, float]] = {}  # {tier: (alpha mask, x, y offset from band centre)}
+        for tier in tiers:
+            bbox = self.font.getbbox(tier)
+            tw, th = bbox[2] - bbox[0], bbox[3] - bbox[1]
+            mask = Image.new("L", (max(1, tw), max(1, th)))
+            ImageDraw.Draw(mask).text((-bbox[0], -bbox[1]), tier, fill=255, font=self.font)
+            x = round((label_width - tw) / 2 + bbox[0])
+            self.labels[tier] = (mask, x, bbox[1] - th / 2 - font_size / 8)
+
+    def paint_label(self, img: Image.Image, tier: str, y_offset: int, tier_height: int):
+        mask, x, dy = self.labels[tier]
+        img.paste((255, 255, 255), (x, round(y_offset + tier_height / 2 + dy)), mask)
+
+
+_layouts: dict[tuple, TierLayout] = {}  # Shared by every renderer in the process
+_layouts_lock = threading.Lock()
+
+
+def decode_icon(data: bytes, sizes: tuple[int, ...]) -> dict[int, Image.Image]:
+    # One decode for every requested tile size: JPEGs are drafted at a reduced DCT scale,
+    # other formats box-reduced to ~2x the largest size before the LANCZOS resample
+    largest = max(sizes)
+    icon = Image.open(io.BytesIO(data))
+    if icon.format == "JPEG":
+        icon.draft("RGB", (largest * 2, largest * 2))
+    if icon.mode not in ("RGB", "RGBA", "L", "LA"):
+        icon = icon.convert("RGBA")  # Palette transparency has to be resolved before reducing
+    factor = min(icon.size) // (largest * 2)
+    if factor > 1:
+        icon = icon.reduce(factor)
+    icon = icon.convert("RGBA")
+    return {size: icon.resize((size, size), Image.Resampling.LANCZOS) for size in sizes}
+
+
+def get_layout(tiers: tuple[str, ...], font_path: str, font_size: int, label_width: int) -> TierLayout:
+    key = (tiers, font_path, font_size, label_width)
+    with _layouts_lock:
+        if key not in _layouts:
+            _layouts[key] = TierLayout(tiers, font_path, font_size, label_width)
+        return _layouts[key]
 
 
 class TemplateRenderer:
+    font_path = "arial.ttf"
+    font_size = 24
+    item_size = 80
+    label_width = 80
+    items_per_row = 10  # how many icons per row before wrapping, the adaptive layout may use more
+    budget: PixelBudget = default_budget  # Shrinks icons and adds columns for big boards, None for a fixed layout
+    icon_variants: tuple[int, ...] = ()  # Extra tile sizes cached from the same decode, e.g. for full-size exports
+
     def __init__(self, tiers: list[str], show_preview: bool = False):
         self.tiers = tiers
         self.items = []
         self.show_preview = show_preview
-        self._icon_cache = {}
+        self._known_icons: set[str] = set()  # Urls already resolved into icon_cache (or negative cached)
+        self._missing_icons: dict[str, set[tuple[str, int]]] = {}  # {url: {(tier, index)}} pasted as placeholders
+        self._missing_lock = threading.Lock()
+        self._render_lock = threading.Lock()  # One render per renderer at a time
+        self._canvas: Image.Image = None  # Retained board, only the bands that change get repainted
 
-    def _load_icon(self, url: str, size: int) -> Image.Image:
-        if url in self._icon_cache:
-            return self._icon_cache[url]
+    @staticmethod
+    def _store_icon(url: str, data: bytes, sizes: tuple[int, ...]):
+        with metrics.time("icon_decode_seconds"):
+            tiles = decode_icon(data, sizes)
+        for size, tile in tiles.items():
+            icon_cache.put(url, size, tile)
 
+    async def _fetch_icon(self, url: str, size: int):
+        data = await icon_fetcher.fetch(url)
         try:
-            response = requests.get(url, timeout=5)
-            response.raise_for_status()
-            icon = Image.open(io.BytesIO(response.content)).convert("RGBA")
-            icon = icon.resize((size, size), Image.Resampling.LANCZOS)
-            self._icon_cache[url] = icon
-            # ImageShow.show(icon)
-            return icon
+            if data is None:
+                raise ValueError("download failed")
+            sizes = tuple(dict.fromkeys((size, *self.icon_variants)))
+            await asyncio.to_thread(self._store_icon, url, data, sizes)
         except Exception:
-            img = Image.new("RGBA", (size, size))
-            self._icon_cache[url] = img
-            # ImageShow.show(img)
-            return img
-    
+            # Retried once the negative entry expires instead of staying blank forever
+            icon_cache.put_negative(url)
+
+    async def fetch_icons(self):
+        # Download every icon the next render needs, in parallel, before compositing
+        with self._missing_lock:
+            retry = list(self._missing_icons)
+        await self.prefetch_icons([url for url, _ in self.items if url not in self._known_icons] + retry)
+
+    async def prefetch_icons(self, candidates: list[str]):
+        # Also used ahead of time for items that have not been added yet
+        missing = []
+        for url in dict.fromkeys(candidates):
+            if icon_cache.is_negative(url):
+                continue
+            if icon_cache.contains(url, self.item_size):
+                self._known_icons.add(url)
+                continue
+            missing.append(url)
+        metrics.inc("icon_lookups_total", len(candidates))
+        if not missing:
+            return
+        await asyncio.gather(*(self._fetch_icon(url, self.item_size) for url in missing))
+        self._known_icons.update(missing)
+
+    def snapshot(self) -> RenderSnapshot:
+        items = tuple((url, tier) for url, tier in self.items)
+        return RenderSnapshot(tuple(self.tiers), items)
+
     def add_item(self, url: str, tier: str):
         self.items.append([url, tier])
 
-    def create_colors(self):
-        n = len(self.tiers)
-        colors = {}
-        for i in range(n):
-            hue = i/n
-            lightness = 0.4
-            saturation = 0.9
-            
-            colors[self.tiers[i]] = tuple(int(c * 255) for c in colorsys.hls_to_rgb(hue, lightness, saturation))
-        return colors
-                
-    def render(self):
-        tier_colors = self.create_colors()
-        # print(tier_colors)
-
-        font_size = 24
-        item_size = 80
-        label_width = 80
-        items_per_row = 10  # how many icons per row before wrapping
-        
-        font = ImageFont.truetype("arial.ttf", font_size)
+    def create_colors(self, tiers: list[str] = None):
+        return tier_colors(self.tiers if tiers is None else tiers)
 
-        # compute tier heights
-        row_heights = []
-        for tier in self.tiers:
-            count = sum(1 for utier in self.items if utier[1] == tier)
-            rows_needed = max(1, math.ceil(count / items_per_row))
-            row_heights.append(rows_needed * item_size)
+    def nbytes(self) -> int:
+        # Approximate memory held by this renderer: the retained canvas plus the item list
+        canvas = self._canvas
+        size = len(canvas.getbands()) * canvas.width * canvas.height if canvas is not None else 0
+        return size + sum(len(url) + len(tier) + 100 for url, tier in self.items)
 
-        total_height = sum(row_heights)
-        total_width = label_width + items_per_row * item_size
+    def release(self):
+        # Drops the retained canvas, the next render rebuilds it from the items
+        # Blocks until a running render finishes, call it off the event loop
+        with self._render_lock:
+            self._canvas = None
+            self._known_icons.clear()
+            with self._missing_lock:
+                self._missing_icons.clear()
+                
+    def render(self, snapshot: RenderSnapshot = None, encoding: EncodeProfile = FINAL_ENCODING):
+        # Renders from a snapshot so callers on other threads never see items change mid-render
+        if snapshot is None:
+            snapshot = self.snapshot()
+        with self._render_lock:
+            with metrics.time("render_seconds"):
+                self._render(snapshot)
+            with metrics.time("encode_seconds", format=encoding.format):
+                return self.encode(encoding)
 
-        img = Image.new("RGBA", (total_width, total_height))
-        draw = ImageDraw.Draw(img)
+    def render_tiles(self, snapshot: RenderSnapshot = None, encoding: EncodeProfile = FINAL_ENCODING) -> list[io.BytesIO]:
+        # Like render(), but a board still over the pixel budget at the smallest icons is cut at row
+        # boundaries into several images, each painted on its own canvas so memory stays bounded by one
+        if snapshot is None:
+            snapshot = self.snapshot()
+        with self._render_lock:
+            layout = self._plan(snapshot)
+            if self.budget is None or layout.width * layout.height <= self.budget.max_pixels:
+                with metrics.time("render_seconds"):
+                    self._render(snapshot)
+                with metrics.time("encode_seconds", format=encoding.format):
+                    return [self.encode(encoding)]
 
-        y_offset = 0
-        for i, tier in enumerate(self.tiers):
-            color = tier_colors.get(tier, (128, 128, 128))
-            tier_height = row_heights[i]
+            cell, columns = layout.item_size, layout.columns
+            tier_urls = {tier: [] for tier in snapshot.tiers}
+            for url, tier in snapshot.items:
+                if tier in tier_urls:
+                    tier_urls[tier].append(url)
 
-            # draw background and label section
-            draw.rectangle([0, y_offset, total_width, y_offset + tier_height], fill=(25, 25, 25))
-            draw.rectangle([0, y_offset, label_width, y_offset + tier_height], fill=color)
+            max_rows = max(1, self.budget.max_pixels // layout.width // cell)
+            tiles = []  # [[(tier, first row, rows), ...], ...]
+            segments, used = [], 0
+            for tier in snapshot.tiers:
+                rows = max(1, math.ceil(len(tier_urls[tier]) / columns))
+                row = 0
+                while row < rows:
+                    take = min(rows - row, max_rows - used)
+                    if take == 0:
+                        tiles.append(segments)
+                        segments, used = [], 0
+                        continue
+                    segments.append((tier, row, take))
+                    row += take
+                    used += take
+            if segments:
+                tiles.append(segments)
 
-            # draw label centered
-            bbox = draw.textbbox((0, 0), tier, font=font)
-            tw, th = bbox[2] - bbox[0], bbox[3] - bbox[1]
-            draw.text(
-                ((label_width - tw) / 2, (y_offset + (tier_height - th) / 2)-font_size/8),
-                tier,
-                fill="white",
-                font=font,
-            )
-
-            # draw tier items tightly packed
-            urls = [url for url, utier in self.items if utier == tier]
-            for idx, url in enumerate(urls):
-                row = idx // items_per_row
-                col = idx % items_per_row
-                x = label_width + col * item_size + 1
-                y = y_offset + row * item_size
-                icon = self._load_icon(url, item_size)
-                img.paste(icon, (x, y))
-
-            y_offset += tier_height
-
-        # return PNG bytes
+            # The retained canvas does not survive a tiled render, the next render() rebuilds it
+            self._canvas = None
+            self._cell, self._columns = cell, columns
+            self._layout = get_layout(snapshot.tiers, self.font_path, self.font_size, self.label_width)
+            out = []
+            for segments in tiles:
+                with metrics.time("render_seconds"):
+                    img = Image.new("RGB", (layout.width, sum(rows for _, _, rows in segments) * cell))
+                    y_offset = 0
+                    for tier, first_row, rows in segments:
+                        urls = tier_urls[tier][first_row * columns:(first_row + rows) * columns]
+                        self._paint_band(img, tier, y_offset, rows * cell, urls)
+                        y_offset += rows * cell
+                with metrics.time("encode_seconds", format=encoding.format):
+                    out.append(self.encode(encoding, img))
+            metrics.inc("render_tiles_total", len(out))
+            return out
+
+    def encode(self, encoding: EncodeProfile = FINAL_ENCODING, img: Image.Image = None) -> io.BytesIO:
+        if img is None:
+            img = self._canvas
+        img = img if img.mode == encoding.mode else img.convert(encoding.mode)
         buf = io.BytesIO()
-        img.save(buf, format="PNG")
+        if encoding.format == "WEBP":
+            img.save(buf, format="WEBP", lossless=encoding.lossless, quality=encoding.quality, method=encoding.method)
+        else:
+            if encoding.palette_colors:
+                img = img.quantize(colors=encoding.palette_colors, method=Image.Quantize.FASTOCTREE)
+            img.save(buf, format="PNG", compress_level=encoding.compress_level)
         buf.seek(0)
 
         if self.show_preview:
+            from PIL import ImageShow  # Drags in IPython when it is installed, only the demo needs it
             ImageShow.show(img)
 
         return buf
 
+    def _plan(self, snapshot: RenderSnapshot) -> BoardLayout:
+        counts = dict.fromkeys(snapshot.tiers, 0)
+        for _, tier in snapshot.items:
+            if tier in counts:
+                counts[tier] += 1
+        return plan_layout(list(counts.values()), self.item_size, self.items_per_row, self.label_width, self.budget)
+
+    def _reset_canvas(self, tiers: tuple[str, ...], layout: BoardLayout):
+        self._canvas_tiers = tiers
+        self._cell, self._columns = layout.item_size, layout.columns
+        self._tier_urls = {tier: [] for tier in tiers}
+        with self._missing_lock:
+            self._missing_icons.clear()
+        self._row_heights = [self._cell] * len(tiers)
+        self._rendered = 0
+        self._last_item = None
+        self._layout = get_layout(tiers, self.font_path, self.font_size, self.label_width)
+
+        total_width = self.label_width + self._columns * self._cell
+        self._canvas = Image.new("RGB", (total_width, sum(self._row_heights)))
+        y_offset = 0
+        for i, tier in enumerate(tiers):
+            self._paint_band(self._canvas, tier, y_offset, self._row_heights[i])
+            y_offset += self._row_heights[i]
+
+    def _band_height(self, count: int) -> int:
+        return max(1, math.ceil(count / self._columns)) * self._cell
+
+    def _icon(self, url: str, size: int) -> Image.Image | None:
+        icon = icon_cache.get(url, size)
+        if icon is None and size != self.item_size:
+            # Smaller cells of the adaptive layout are scaled from the fetched tile instead of re-downloading
+            base = icon_cache.get(url, self.item_size)
+            if base is not None:
+                icon = base.resize((size, size), Image.Resampling.LANCZOS)
+                icon_cache.put(url, size, icon)
+        return icon
+
+    def _paste_item(self, img: Image.Image, url: str, tier: str, idx: int, y_offset: int):
+        row = idx // self._columns
+        col = idx % self._columns
+        x = self.label_width + col * self._cell + 1
+        y = y_offset + row * self._cell
+        icon = self._icon(url, self._cell)
+        if icon is None:
+            # Never hit the network from render(), leave the band background to fill in on a later render
+            with self._missing_lock:
+                self._missing_icons.setdefault(url, set()).add((tier, idx))
+            return
+        img.paste(icon, (x, y), icon)  # Alpha composited onto the opaque band
+        if self._missing_icons:
+            # Pasted by a band repaint, the placeholder fill must not composite it a second time
+            with self._missing_lock:
+                positions = self._missing_icons.get(url)
+                if positions is not None:
+                    positions.discard((tier, idx))
+                    if not positions:
+                        del self._missing_icons[url]
+
+    def _paint_band(self, img: Image.Image, tier: str, y_offset: int, tier_height: int, urls: list[str] = None):
+        draw = ImageDraw.Draw(img)
+        color = self._layout.colors.get(tier, (128, 128, 128))
+
+        # draw background and label section
+        draw.rectangle([0, y_offset, img.width, y_offset + tier_height], fill=(25, 25, 25))
+        draw.rectangle([0, y_offset, self.label_width, y_offset + tier_height], fill=color)
+
+        # paste the pre-rendered label centered
+        self._layout.paint_label(img, tier, y_offset, tier_height)
+
+        # draw tier items tightly packed
+        for idx, url in enumerate(self._tier_urls[tier] if urls is None else urls):
+            self._paste_item(img, url, tier, idx, y_offset)
+
+    def _grow_canvas(self, tiers: tuple[str, ...], new_heights: list[int]) -> set[str]:
+        # Copy bands whose height is unchanged, repaint the ones that gained a row
+        old = self._canvas
+        img = Image.new("RGB", (old.width, sum(new_heights)))
+        repainted = set()
+        old_y = new_y = 0
+        for i, tier in enumerate(tiers):
+            old_h, new_h = self._row_heights[i], new_heights[i]
+            if old_h == new_h:
+                img.paste(old.crop((0, old_y, old.width, old_y + old_h)), (0, new_y))
+            else:
+                self._paint_band(img, tier, new_y, new_h)
+                repainted.add(tier)
+            old_y += old_h
+            new_y += new_h
+
+        self._canvas = img
+        self._row_heights = new_heights
+        return repainted
+
+    def _render(self, snapshot: RenderSnapshot):
+        tiers, items = snapshot.tiers, snapshot.items
+
+        # The retained canvas is only valid if items were appended since the last render,
+        # and the adaptive layout kept its icon size and columns
+        layout = self._plan(snapshot)
+        if (self._canvas is None
+                or tiers != self._canvas_tiers
+                or (layout.item_size, layout.columns) != (self._cell, self._columns)
+                or len(items) < self._rendered
+                or (self._rendered and items[self._rendered - 1] != self._last_item)):
+            self._reset_canvas(tiers, layout)
+
+        added: dict[str, list[int]] = {}  # {tier: [index in tier, ...]} for items not yet on the canvas
+        for url, tier in items[self._rendered:]:
+            if tier not in self._tier_urls:
+                continue
+            self._tier_urls[tier].append(url)
+            added.setdefault(tier, []).append(len(self._tier_urls[tier]) - 1)
+
+        repainted = set()
+        new_heights = [self._band_height(len(self._tier_urls[tier])) for tier in tiers]
+        if new_heights != self._row_heights:
+            repainted = self._grow_canvas(tiers, new_heights)
+
+        y_offsets = {}
+        y_offset = 0
+        for i, tier in enumerate(tiers):
+            y_offsets[tier] = y_offset
+            y_offset += self._row_heights[i]
+
+        for tier, indexes in added.items():
+            if tier in repainted:
+                continue
+            urls = self._tier_urls[tier]
+            for idx in indexes:
+                self._paste_item(self._canvas, urls[idx], tier, idx, y_offsets[tier])
+
+        # Fill in placeholders whose icon has arrived since they were pasted
+        with self._missing_lock:
+            ready = [url for url in self._missing_icons if icon_cache.contains(url, self.item_size)]
+            filled = {url: self._missing_icons.pop(url) for url in ready}
+        for url, positions in filled.items():
+            for tier, idx in positions:
+                self._paste_item(self._canvas, url, tier, idx, y_offsets[tier])
+
+        self._rendered = len(items)
+        self._last_item = items[-1] if items else None
+
+
+def warm_up(tiers: list[str]):
+    # Loads the image plugins and the tiers' fonts and labels, so the first render after startup is not the slow one
+    Image.init()
+    get_layout(tuple(tiers), TemplateRenderer.font_path, TemplateRenderer.font_size, TemplateRenderer.label_width)
+
+
+def render_snapshot(snapshot: RenderSnapshot, encoding: EncodeProfile = FINAL_ENCODING) -> bytes:
+    # Entry point for process pool workers, which cannot share the session's renderer
+    # Icons come from the on-disk icon_cache, which every process shares
+    return TemplateRenderer(list(snapshot.tiers)).render(snapshot, encoding).getvalue()
+
+
+def render_snapshot_tiles(snapshot: RenderSnapshot, encoding: EncodeProfile = FINAL_ENCODING) -> list[bytes]:
+    return [tile.getvalue() for tile in TemplateRenderer(list(snapshot.tiers)).render_tiles(snapshot, encoding)]
+
 
 if __name__ == "__main__":
     renderer = TemplateRenderer(
@@ -143,5 +496,10 @@ if __name__ == "__main__":
             ["https://cdn.discordapp.com/avatars/334528593323622402/d556ed8ba7449dd672105d63799827f9.png", "S"],
             ["https://cdn.discordapp.com/avatars/334528593323622402/d556ed8ba7449dd672105d63799827f9.png", "S"]
         ]
-    renderer.render()
+    async def main():
+        await renderer.fetch_icons()
+        renderer.render()
+        await icon_fetcher.close()
+
+    asyncio.run(main())
     # print(colorsys.hls_to_rgb(0.33, 0.5, 1))
@@ -0,0 +1,33 @@
+import discord
+
+
+class COMPONENT_IDS:
+    # Actions in "tv:<session>:<round>:<action>" custom ids, vote buttons use the tier index instead
+    PREFIX = "tv"
+    JOIN = "join"
+    START_VOTE = "start"
+    PARTICIPANTS = "participants"
+    NEXT_VOTE = "next"
+    END_VOTE = "end"
+
+
+def component_id(session_id: int, round: int, action: str | int) -> str:
+    return f"{COMPONENT_IDS.PREFIX}:{session_id}:{round}:{action}"
+
+
+def parse_component_id(custom_id: str) -> tuple[int, int, str] | None:
+    parts = custom_id.split(":")
+    if len(parts) != 4 or parts[0] != COMPONENT_IDS.PREFIX or not parts[1].isdigit() or not parts[2].isdigit():
+        return None
+    return int(parts[1]), int(parts[2]), parts[3]
+
+
+class StaticView(discord.ui.View):
+    # Only describes the buttons of a message: stopped from the start so discord.py never keeps it in its view store,
+    # clicks reach the session through the component dispatcher by custom id, even after a restart
+    def __init__(self):
+        super().__init__(timeout=None)
+        self.stop()
+
+    def add_button(self, label: str, custom_id: str, style: discord.ButtonStyle = discord.ButtonStyle.primary):
+        self.add_item(discord.ui.Button(label=label, style=style, custom_id=custom_id))
@@ -1,22 +1,32 @@
 import discord
-from .PublicPanel import PublicPanel
+from .Base import StaticView, COMPONENT_IDS, component_id
 
 
 # TIERS = ["S", "A", "B", "C", "D", "E", "Maid", "No Life"] # for vote view(used later)
 
-class COMPONENT_IDS:
-    START_VOTE = 50
-    NEXT_VOTE = 51
-
 
 desc_template = "Use the buttons below to control the registration process.\nCurrent Status: {}\nParticipants: {}"
 
-class ControlView(discord.ui.View):
+class ControlView(StaticView):
     def __init__(self):
-        super().__init__(timeout=None)
+        super().__init__()
         self.status = "Waiting for participants..."
         self.message: discord.Message = None
         self.embed = ControlEmbed()
+    
+    # Registration buttons use round 0, Next/End carry the round they close so a repeated click is seen as stale
+    def show_registration(self, session_id: int):
+        self.clear_items()
+        self.add_button("Start Vote", component_id(session_id, 0, COMPONENT_IDS.START_VOTE), discord.ButtonStyle.success)
+        self.add_button("Participants", component_id(session_id, 0, COMPONENT_IDS.PARTICIPANTS), discord.ButtonStyle.secondary)
+    
+    def show_next_vote(self, session_id: int, round: int):
+        self.clear_items()
+        self.add_button("Next Vote", component_id(session_id, round, COMPONENT_IDS.NEXT_VOTE), discord.ButtonStyle.success)
+    
+    def show_end_vote(self, session_id: int, round: int):
+        self.clear_items()
+        self.add_button("End Vote", component_id(session_id, round, COMPONENT_IDS.END_VOTE), discord.ButtonStyle.danger)
 
 class ControlEmbed(discord.Embed):
     def __init__(self):
@@ -1,19 +1,15 @@
 import discord
-from typing import Callable
-from asyncio import create_task
+from .Base import StaticView, COMPONENT_IDS, component_id
 
-class PublicPanel(discord.ui.View):
+class PublicPanel(StaticView):
     def __init__(self):
-        super().__init__(timeout=None)
+        super().__init__()
 
         self.embed = RegisterEmbed()
         self.message: discord.Message = None
-        
-class JoinButton(discord.ui.Button):
-    def __init__(self, callback: Callable[[discord.Interaction], None] = None):
-        super().__init__(label="Join", style=discord.ButtonStyle.primary, id=36)
-        self.Participants = set()  # Set to store user IDs of participants
-        self.callback = callback
+    
+    def add_join_button(self, session_id: int):
+        self.add_button("Join", component_id(session_id, 0, COMPONENT_IDS.JOIN))
 
 class RegisterEmbed(discord.Embed):
     def __init__(self):
@@ -26,9 +22,9 @@ class RegisterEmbed(discord.Embed):
     def set_participant_count(self, count: int):
         self.description = f"Click the button below to participate in the tierlist!\nTotal Participants: {count}"
 
-class VotePanel(discord.ui.View, discord.Embed):
+class VotePanel(StaticView, discord.Embed):
     def __init__(self, tiers: list[str] = ["S", "A", "B", "C", "D", "E", "Maid", "No Life"]):
-        discord.ui.View.__init__(self, timeout=None)
+        StaticView.__init__(self)
         discord.Embed.__init__(self, title="Tier List Voting", 
                                description="The voting has begun! Stay tuned for results.", 
                                color=0x0000ff
@@ -47,31 +43,14 @@ class VotePanel(discord.ui.View, discord.Embed):
 
         self.set_image(url=avatar_url)
 
-    def create_vote_buttons(self, cast_vote: Callable[[discord.Interaction, int, str], None] = None):
+    def create_vote_buttons(self, session_id: int, round: int):
+        # The custom id carries the tier index and the round, a click on an older round's panel is turned away
         self.clear_items()
+        self.round = round
         for i, tier in enumerate(self.TIERS):
             if self.stage_user.id == 1126495387683926036 and tier != 'Maid': # This one is a maid
                 continue
-            vote_button = VoteButton(label=tier, stage_user=self.stage_user, cast_vote=cast_vote, id=100 + i)
-            self.add_item(vote_button)
+            self.add_button(tier, component_id(session_id, round, i))
     
     def add_avatar_exception(self, excepts: dict[int, str]):
         self.avatar_excepts = excepts
-
-class VoteButton(discord.ui.Button):
-    def __init__(self, label: str, stage_user: discord.User, cast_vote: Callable[[discord.Interaction, int, str], None] = None, id: int = None):
-        super().__init__(label=label, style=discord.ButtonStyle.primary, id=id)
-        self.cast_vote = cast_vote
-        self.stage_user = stage_user
-        self.view: VotePanel
-
-    async def callback(self, interaction: discord.Interaction):
-        await interaction.response.defer(ephemeral=True)
-        if self.view.stage_user.id == interaction.user.id:
-            create_task(interaction.followup.send("You cannot vote for yourself!", ephemeral=True))
-            return
-        
-        if self.cast_vote:
-            create_task(self.cast_vote(interaction, self.label))
-            return
-
@@ -1,20 +1,71 @@
 from .Views.ControlPanel import ControlView
-from .Views.PublicPanel import PublicPanel, JoinButton, VotePanel
-from .TemplateRenderer import TemplateRenderer
+from .Views.PublicPanel import PublicPanel, VotePanel
+from .Views.Base import COMPONENT_IDS
+from .TemplateRenderer import TemplateRenderer, LIVE_ENCODING, FINAL_ENCODING
+from .RenderExecutor import render_executor
+from .IconCache import icon_cache
+from .EditScheduler import EditScheduler
+from .VoteStore import VoteStore, SubjectVotes
+from .SessionStore import session_store
+from .Metrics import metrics
+from .SessionManager import session_manager
+from .Coordinator import coordinator, worker_id
 import discord
 from discord import File
-from random import shuffle
-from asyncio import create_task, gather
+from random import shuffle, getrandbits
+from asyncio import create_task, gather, get_running_loop, to_thread, Lock, Queue, QueueFull, Task
+from time import monotonic
+from collections import deque
+from itertools import islice
 
 
 default_tiers = ["Maid", "S", "A", "B", "C", "D", "E"]
 default_limits = {"Maid": 2}
+prefetch_ahead = 3  # Upcoming participants whose member and avatar are loaded during the current round
+vote_queue_size = 5000  # Clicks waiting for the vote worker before new ones are turned away
+vote_batch_size = 256  # Votes applied per worker wake-up
 
 avatars_except = {334528593323622402 : "https://media.discordapp.net/attachments/1109856204374683768/1433729472141463623/content.png?ex=690668df&is=6905175f&hm=b584654bc6d8b37c29ac36b9098c1f93da4b60e4b287dcd3e21faa9847b29522&=&format=webp&quality=lossless&width=953&height=953",
                   1126495387683926036: "https://media.discordapp.net/attachments/1420435951376662671/1421833746075615242/raw.png?ex=6906a39d&is=6905521d&hm=6adb5fd3686f2817bcd080bee1af2c6fafdff7fea578844b559e6c2873320145&=&format=webp&quality=lossless&width=953&height=953"}
 
+def avatar_url_for(user: discord.User) -> str:
+    if user.id in avatars_except:
+        return avatars_except[user.id]
+    return user.avatar.url if user.avatar else user.default_avatar.url
+
+async def reply(interaction: discord.Interaction, content: str):
+    # Forwarded and restored clicks arrive already deferred, those get a followup instead
+    if interaction.response.is_done():
+        await interaction.followup.send(content, ephemeral=True)
+    else:
+        await interaction.response.send_message(content, ephemeral=True)
+
+async def defer(interaction: discord.Interaction):
+    if not interaction.response.is_done():
+        await interaction.response.defer(ephemeral=True)
+
+def new_session_id() -> int:
+    # Snowflake-like, known before any message is sent so the first buttons can already carry it
+    return discord.utils.time_snowflake(discord.utils.utcnow()) | getrandbits(22)
+
+def load_analytics():
+    # numpy is optional and slow to import, so it is loaded on first use (or by prewarm) instead of at startup
+    try:
+        from . import Analytics
+    except ImportError:
+        return None
+    return Analytics
+
+async def prewarm():
+    # Run in the background after login, so the first vote does not pay for imports, fonts, the render pool
+    # and the walk over the icon cache directory
+    try:
+        await gather(to_thread(load_analytics), to_thread(icon_cache.load_index), render_executor.warm_up(default_tiers))
+    except Exception as e:
+        print("Prewarm failed:", e)
+
 class VoteControl:
-    channel: dict[int, "VoteControl"] = {} # Dictionary to store active VoteControl instances by channel ID
+    channel: dict[int, "VoteControl"] = session_manager.sessions # Dictionary to store active VoteControl instances by channel ID
     def __init__(self, channel: discord.TextChannel, host: discord.User):
         VoteControl.channel[channel.id] = self
         self.publicPanel: PublicPanel = PublicPanel()
@@ -29,23 +80,36 @@ class VoteControl:
         self.Participants = set([]) # Set to store user IDs of participants
         self.status = "Waiting for participants"
         self.Votes: dict[int, VoteHandler] = {}  # Dictionary to store votes {user_id: VoteHandler}
-        self.ParticipantArray = []
-        self.voteCounter = VoteCounter()
+        self.ParticipantArray: deque[int] = deque()  # Voting order, popped from the left each round
+        self._upcoming: dict[int, discord.Member] = {}  # Prefetched members of the next participants
+        self.voteStore = VoteStore(default_tiers)  # Every vote of the session, VoteHandler/VoteCounter are views over it
+        self.voteCounter = VoteCounter(self.voteStore)
+        self.sessionId: int = None  # Row in the session store, also carried by every button custom id
+        self.round = 0  # Number of the subject currently being voted on, 0 during registration
+        self.voteQueue: Queue = Queue(maxsize=vote_queue_size)  # Votes and round changes, applied in order by one worker
+        self._voteWorker: Task = None
+        self._controlling = False  # A Start, Next or End click is being handled
+        self._boardSeq = 0  # Latest requested tierboard update, older ones are dropped
+        self._boardLock = Lock()  # One tierboard render and edit at a time, in request order
+        self._tasks: set[Task] = set()  # Fire-and-forget tasks, cancelled if the session is evicted
+        self.lastActive = monotonic()  # Last button click, the session manager evicts idle sessions
         
 
 
     async def start(self):
+        created = self.sessionId is None
+        if created:
+            self.sessionId = new_session_id()
+            session_manager.by_id[self.sessionId] = self
+            session_store.create_session(self.sessionId, self.PublicChannel.id, self.PublicChannel.guild.id,
+                                         self.Host.id, default_tiers, self.status)
+        await to_thread(coordinator.attach, self.sessionId, self.PublicChannel.id)
+        
         """BUTTONS SECTION"""
-        # Add a button to start the vote in the control panel
-        startVoteButton = discord.ui.Button(label="Start Vote", style=discord.ButtonStyle.success)
-        startVoteButton.callback = self.on_start_vote
-        self.controlPanel.add_item(startVoteButton)
-        # Add a button to check participants in the control panel
-        checkParticipantsButton = discord.ui.Button(label="Participants", style=discord.ButtonStyle.secondary)
-        checkParticipantsButton.callback = self.on_check_participants
-        self.controlPanel.add_item(checkParticipantsButton)
+        # Start Vote and Participants buttons in the control panel
+        self.controlPanel.show_registration(self.sessionId)
         # Add a join button to the public panel
-        self.publicPanel.add_item(JoinButton(callback=self.on_join_button_click))
+        self.publicPanel.add_join_button(self.sessionId)
         
         """MESSAGES SECTION"""
         # Send the control panel to the host via DM
@@ -56,156 +120,368 @@ class VoteControl:
         self.PublicMessage = await self.PublicChannel.send(
             embed=self.publicPanel.embed,
             view=self.publicPanel)
+        # All later edits go through these so bursts of clicks collapse into one edit
+        self.privateEditor = EditScheduler(self.PrivateMessage)
+        self.publicEditor = EditScheduler(self.PublicMessage)
+        
+        session_store.update_session(self.sessionId, private_message_id=self.PrivateMessage.id,
+                                     public_message_id=self.PublicMessage.id)
     
-    def remove(self):
-        del VoteControl.channel[self.PublicChannel.id]
+    def _load(self, saved: dict):
+        # Session state from the session store, shared by resume() and restore()
+        self.sessionId = saved["id"]
+        session_manager.by_id[self.sessionId] = self
+        self.Participants = set(saved["participants"])
+        for subject_id, voter_id, tier in saved["votes"]:
+            self.voteStore.set_vote(subject_id, voter_id, tier)
+        for item in saved["items"]:
+            self.renderer.add_item(item["url"], item["tier"])
+            self.voteCounter.add_round(item["user_id"])
+        
+        if saved["phase"] == "registration":
+            self.controlPanel.embed.description = f"Use the buttons below to control the registration process.\nCurrent Status: {self.status}\nParticipants: {len(self.Participants)}"
+            self.publicPanel.embed.set_participant_count(len(self.Participants))
+            return
+        
+        done = {item["user_id"] for item in saved["items"]}
+        stage_id = saved["stage_user_id"]
+        self.ParticipantArray = deque(uid for uid in saved["order"] if uid not in done and uid != stage_id)
+        self.round = saved["round"]
+        
+        self.status = "Voting in progress..."
+        self.controlPanel.embed.description = f"Use the buttons below to control the registration process.\nCurrent Status: {self.status}\nParticipants: {len(self.Participants)}"
+        if self.ParticipantArray:
+            self.controlPanel.show_next_vote(self.sessionId, self.round)
+        else:
+            self.controlPanel.show_end_vote(self.sessionId, self.round)
+    
+    @classmethod
+    async def restore(cls, channel: discord.TextChannel, host: discord.User, saved: dict) -> "VoteControl":
+        # Picks a session up again after a restart on its existing messages, whose buttons still carry its custom ids
+        # Falls back to resume() and fresh messages if any of them is gone
+        self = cls(channel, host)
+        self._load(saved)
+        await to_thread(coordinator.attach, self.sessionId, channel.id)
+        try:
+            dm = host.dm_channel or await host.create_dm()
+            self.PrivateMessage = await dm.fetch_message(saved["private_message_id"])
+            self.PublicMessage = await channel.fetch_message(saved["public_message_id"])
+            if saved["phase"] == "voting":
+                self.boardMessage = await channel.fetch_message(saved["board_message_id"])
+        except (discord.NotFound, discord.HTTPException, TypeError):
+            await self.remove(release=False)  # resume() takes over the channel claim
+            return await cls.resume(channel, host, saved)
+        
+        self.privateEditor = EditScheduler(self.PrivateMessage)
+        self.publicEditor = EditScheduler(self.PublicMessage)
+        if saved["phase"] == "registration":
+            self.controlPanel.show_registration(self.sessionId)
+            self.publicPanel.add_join_button(self.sessionId)
+            return self
+        
+        self.boardEditor = EditScheduler(self.boardMessage)
+        stage_user = channel.guild.get_member(saved["stage_user_id"]) or await channel.guild.fetch_member(saved["stage_user_id"])
+        self.votePanel = VotePanel(tiers=default_tiers)
+        self.votePanel.add_avatar_exception(avatars_except)
+        self.votePanel.set_stage_user(stage_user)
+        self.votePanel.create_vote_buttons(self.sessionId, self.round)
+        self.Votes[stage_user.id] = VoteHandler(stage_user, default_tiers, self.voteStore)
+        self.votePanel.set_footer(text=f"Voted: {len(self.Votes[stage_user.id].Tiers)}")
+        self.spawn(self.prefetch_upcoming())
+        return self
+    
+    @classmethod
+    async def resume(cls, channel: discord.TextChannel, host: discord.User, saved: dict) -> "VoteControl":
+        # Rebuild a session from the session store on new messages
+        self = cls(channel, host)
+        self._load(saved)
+        if saved["phase"] == "registration":
+            await self.start()
+            return self
+        stage_id = saved["stage_user_id"]
+        await to_thread(coordinator.attach, self.sessionId, channel.id)
+        
+        self.PrivateMessage = await self.Host.send(embed=self.controlPanel.embed, view=self.controlPanel)
+        self.privateEditor = EditScheduler(self.PrivateMessage)
+        
+        try:
+            self.boardMessage = await channel.fetch_message(saved["board_message_id"])
+        except (discord.NotFound, discord.HTTPException):
+            self.boardMessage = await channel.send(embed=self.publicPanel.embed)
+        self.boardEditor = EditScheduler(self.boardMessage)
+        
+        try:
+            old_panel = await channel.fetch_message(saved["public_message_id"])
+            self.spawn(old_panel.delete())
+        except (discord.NotFound, discord.HTTPException):
+            pass
+        
+        self.PublicMessage = self.boardMessage
+        await self.send_vote_panel(channel.guild.get_member(stage_id) or await channel.guild.fetch_member(stage_id))
+        session_store.update_session(self.sessionId, private_message_id=self.PrivateMessage.id,
+                                     board_message_id=self.boardMessage.id)
+        self.spawn(self.update_tierboard())
+        return self
+    
+    async def remove(self, release: bool = True):
+        if self._voteWorker is not None:
+            self._voteWorker.cancel()
+        if release:
+            # Before the channel is freed locally, so a new /voteregister cannot claim it ahead of this release
+            await to_thread(coordinator.release, self.PublicChannel.id, worker_id)
+        VoteControl.channel.pop(self.PublicChannel.id, None)
+        if session_manager.by_id.get(self.sessionId) is self:
+            del session_manager.by_id[self.sessionId]
         del self.renderer
         del self
     
+    def spawn(self, coro) -> Task:
+        task = create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+    
+    def touch(self):
+        self.lastActive = monotonic()
+    
+    def nbytes(self) -> int:
+        # Rough footprint: vote matrix, retained canvas and items, queued clicks and bookkeeping
+        return (self.voteStore.nbytes()
+                + self.renderer.nbytes()
+                + self.voteQueue.qsize() * 200
+                + (len(self.Participants) + len(self.Votes)) * 100)
+    
+    async def evict(self):
+        # Frees an idle session, its store row is left as is so /voteresume can pick it up again
+        for view in (self.publicPanel, self.controlPanel, getattr(self, "votePanel", None)):
+            if view is not None:
+                view.stop()
+        for editor in (getattr(self, "publicEditor", None), getattr(self, "privateEditor", None), getattr(self, "boardEditor", None)):
+            if editor is not None:
+                editor.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        await to_thread(self.renderer.release)  # Waits out a render still running on the executor without blocking the loop
+        
+        if self.sessionId is not None:
+            session_store.update_session(self.sessionId, status="Expired after inactivity.")
+        notice = "This tier list vote expired after inactivity, an admin can continue it with /voteresume."
+        for message in (getattr(self, "PublicMessage", None), getattr(self, "PrivateMessage", None)):
+            if message is None:
+                continue
+            try:
+                await message.edit(content=notice, view=None)
+            except discord.HTTPException:
+                pass
+        await self.remove()
+    
+    @metrics.timed("handler_seconds", handler="update_tierboard")
     async def update_tierboard(self):
-        # Render the tierboard image
-        img_buf = self.renderer.render()
-        discord_file = File(fp=img_buf, filename="tierboard.png")
-        
-        # Update the public message with the new tierboard image
-        self.publicPanel.embed.title = "Tier List Voting - Current Standings"
-        self.publicPanel.embed.description = "The current tier list standings based on votes so far."
-        self.publicPanel.embed.color = 0x00ffff  # Change embed color to cyan
-        self.publicPanel.embed.set_footer(text="Current Tier List")
-        self.publicPanel.embed.set_image(url="attachment://tierboard.png")
-        await self.boardMessage.edit(embed=self.publicPanel.embed, attachments=[discord_file])
+        # Fetch missing icons concurrently, then render the tierboard image off the event loop
+        # Only the latest request renders and publishes, so a slow older snapshot never replaces a newer board
+        self._boardSeq += 1
+        seq = self._boardSeq
+        await self.renderer.fetch_icons()
+        async with self._boardLock:
+            if seq != self._boardSeq:
+                metrics.inc("tierboard_updates_skipped_total")
+                return
+            img_buf = await render_executor.render(self.renderer, LIVE_ENCODING)
+            if seq != self._boardSeq:
+                metrics.inc("tierboard_updates_skipped_total")
+                return
+            discord_file = File(fp=img_buf, filename=f"tierboard.{LIVE_ENCODING.extension}")
+        
+            # Update the public message with the new tierboard image
+            self.publicPanel.embed.title = "Tier List Voting - Current Standings"
+            self.publicPanel.embed.description = "The current tier list standings based on votes so far."
+            self.publicPanel.embed.color = 0x00ffff  # Change embed color to cyan
+            self.publicPanel.embed.set_footer(text="Current Tier List")
+            self.publicPanel.embed.set_image(url=f"attachment://{discord_file.filename}")
+            await self.boardEditor.flush(embed=self.publicPanel.embed, attachments=[discord_file])
     
+    @metrics.timed("handler_seconds", handler="on_join_button_click")
     async def on_join_button_click(self, interaction: discord.Interaction):
+        self.touch()
         if interaction.user.id in self.Participants:
-            create_task(interaction.response.send_message("You already joined the tier list voting!", ephemeral=True))
+            self.spawn(reply(interaction, "You already joined the tier list voting!"))
         else:
             self.Participants.add(interaction.user.id)
-            create_task(interaction.response.send_message("You have successfully joined the tier list voting!", ephemeral=True))
+            session_store.add_participant(self.sessionId, interaction.user.id)
+            self.spawn(reply(interaction, "You have successfully joined the tier list voting!"))
 
 
         self.controlPanel.embed.description = f"Use the buttons below to control the registration process.\nCurrent Status: {self.status}\nParticipants: {len(self.Participants)}"
-        create_task(self.PrivateMessage.edit(embed=self.controlPanel.embed))
+        self.privateEditor.request(embed=self.controlPanel.embed)
         
         self.publicPanel.embed.set_participant_count(len(self.Participants))
-        create_task(self.PublicMessage.edit(embed=self.publicPanel.embed))
+        self.publicEditor.request(embed=self.publicPanel.embed)
     
     async def on_check_participants(self, interaction: discord.Interaction):
+        self.touch()
         if not self.Participants:
-            await interaction.response.send_message("No participants have joined yet.", ephemeral=True)
+            await reply(interaction, "No participants have joined yet.")
             return
         
         parts = "\n".join([f"- <@{pid}>" for pid in self.Participants])
-        await interaction.response.send_message(f"Current participants:\n{parts}", ephemeral=True)
+        await reply(interaction, f"Current participants:\n{parts}")
     
+    @metrics.timed("handler_seconds", handler="on_start_vote")
     async def on_start_vote(self, interaction: discord.Interaction):
+        self.touch()
         if len(self.Participants) < 2:
-            await interaction.response.send_message("At least two participants are required to start the vote.", ephemeral=True)
+            await reply(interaction, "At least two participants are required to start the vote.")
             return
         
-        self.controlPanel.clear_items()
-
-        nextButton = discord.ui.Button(label="Next Vote", style=discord.ButtonStyle.success)
-        nextButton.callback = self.on_next_vote
-        self.controlPanel.add_item(nextButton)
+        self.controlPanel.show_next_vote(self.sessionId, 1)  # start_vote() opens round 1
         
 
         self.status = "Voting in progress..."
         self.controlPanel.embed.description = f"Use the buttons below to control the registration process.\nCurrent Status: {self.status}\nParticipants: {len(self.Participants)}"
         
-        await self.PrivateMessage.edit(embed=self.controlPanel.embed, view=self.controlPanel)
+        await self.privateEditor.flush(embed=self.controlPanel.embed, view=self.controlPanel)
         
         self.publicPanel.clear_items()
         self.publicPanel.embed.color = 0x0000ff  # Change embed color to blue
-        await self.PublicMessage.edit(view=self.publicPanel, embed=self.publicPanel.embed)
+        await self.publicEditor.flush(view=self.publicPanel, embed=self.publicPanel.embed)
         self.publicPanel.stop()
                 
-        self.ParticipantArray = list(self.Participants)
-        shuffle(self.ParticipantArray)  # Randomize voting order
+        order = list(self.Participants)
+        shuffle(order)  # Randomize voting order
+        self.ParticipantArray = deque(order)
+        session_store.set_order(self.sessionId, order)
+        session_store.update_session(self.sessionId, phase="voting", status=self.status)
         
         await self.start_vote(interaction)
 
-        create_task(interaction.response.send_message("Voting has started!", ephemeral=True))
+        self.spawn(reply(interaction, "Voting has started!"))
 
+    @metrics.timed("handler_seconds", handler="on_next_vote")
     async def on_next_vote(self, interaction: discord.Interaction):
+        self.touch()
         # print(self.ParticipantArray)
-        await interaction.response.defer(ephemeral=True)
+        await defer(interaction)
+        # Resolve the next participant before any round state changes, the prefetch may not have reached them yet
+        participant_ID = self.ParticipantArray[0]
+        if participant_ID not in self._upcoming:
+            guild = self.PublicChannel.guild
+            try:
+                self._upcoming[participant_ID] = guild.get_member(participant_ID) or await guild.fetch_member(participant_ID)
+            except discord.HTTPException:
+                self.spawn(reply(interaction, "Could not load the next participant, please try again."))
+                return
+        # Runs on the vote worker, so every vote queued before this click lands in the round it was cast for
+        participant = await self.run_exclusive(self._advance_round)
+        self.spawn(self.update_tierboard())
+        
+        # The button is resent every round with the new round in its custom id
+        if len(self.ParticipantArray) < 1:
+            self.controlPanel.show_end_vote(self.sessionId, self.round)
+        else:
+            self.controlPanel.show_next_vote(self.sessionId, self.round)
+        self.spawn(self.privateEditor.flush(embed=self.controlPanel.embed, view=self.controlPanel))
+            
+        edittask = self.spawn(self.publicEditor.flush(
+            embed=self.votePanel,
+            view=self.votePanel
+        ))
+
+        self.spawn(interaction.followup.send(f"Now voting for {participant.name}.", ephemeral=True))
+        self.spawn(self.prefetch_upcoming())
+
+    def _close_round(self):
+        # Puts the current stage user on the tierboard
         if self.votePanel.stage_user.id not in self.Votes:
-            self.Votes[self.votePanel.stage_user.id] = VoteHandler(self.votePanel.stage_user, default_tiers)
+            self.Votes[self.votePanel.stage_user.id] = VoteHandler(self.votePanel.stage_user, default_tiers, self.voteStore)
         
-        #Update tierboard before moving to next vote
-        avatar_url = self.votePanel.stage_user.avatar.url if self.votePanel.stage_user.avatar else self.votePanel.stage_user.default_avatar.url
-        if self.votePanel.stage_user.id in avatars_except:
-            print("Using excepted avatar for", self.votePanel.stage_user.id)
-            avatar_url = avatars_except[self.votePanel.stage_user.id]
+        avatar_url = avatar_url_for(self.votePanel.stage_user)
         
         self.renderer.add_item(
                                 avatar_url,
                                 self.Votes[self.votePanel.stage_user.id].calc_results()
                                 )
-        create_task(self.update_tierboard())
+        session_store.add_item(self.sessionId, len(self.renderer.items) - 1, self.votePanel.stage_user.id, *self.renderer.items[-1])
+
+    def _advance_round(self) -> discord.Member:
+        self._close_round()
         
         #Update vote counts
-        for voter_id in self.Votes[self.votePanel.stage_user.id].Tiers:
-            voted_tier = self.Votes[self.votePanel.stage_user.id].Tiers[voter_id]
-            self.voteCounter.add_vote(voter_id, voted_tier)
+        self.voteCounter.add_round(self.votePanel.stage_user.id)
         
         # print(self.voteCounter)
         
         #Move to next participant
-        participant_ID = self.ParticipantArray.pop(0)
-        participant = self.PublicMessage.guild.get_member(participant_ID)
+        participant_ID = self.ParticipantArray.popleft()
+        participant = self._upcoming.pop(participant_ID, None) or self.PublicMessage.guild.get_member(participant_ID)
         
+        self.round += 1
         self.votePanel.set_stage_user(participant)
-        self.votePanel.create_vote_buttons(
-            cast_vote=self.cast_vote
-        )
+        self.votePanel.create_vote_buttons(self.sessionId, self.round)
         
         self.votePanel.set_footer(text="Voted: 0")
-        
-        if len(self.ParticipantArray) < 1:
-            self.controlPanel.clear_items()
-            FinalizeButton = discord.ui.Button(label="End Vote", style=discord.ButtonStyle.danger)
-            FinalizeButton.callback = self.on_end_vote
-            self.controlPanel.add_item(FinalizeButton)
-            create_task(self.PrivateMessage.edit(embed=self.controlPanel.embed, view=self.controlPanel))
-            
-        edittask = create_task(self.PublicMessage.edit(
-            embed=self.votePanel,
-            view=self.votePanel
-        ))
+        session_store.update_session(self.sessionId, stage_user_id=participant_ID, round=self.round)
                 
         #Initialize VoteHandler for the next participant
         if participant_ID not in self.Votes:
-            self.Votes[participant_ID] = VoteHandler(self.votePanel.stage_user, default_tiers)
-
-        create_task(interaction.followup.send(f"Now voting for {participant.name}.", ephemeral=True))
+            self.Votes[participant_ID] = VoteHandler(self.votePanel.stage_user, default_tiers, self.voteStore)
+        return participant
 
     async def start_vote(self, interaction: discord.Interaction):
-        participant_ID = self.ParticipantArray.pop(0)
-        participant = self.PublicMessage.guild.get_member(participant_ID)
-
+        participant_ID = self.ParticipantArray.popleft()
+        guild = self.PublicMessage.guild
+        participant = guild.get_member(participant_ID) or await guild.fetch_member(participant_ID)
+        
+        self.boardMessage = self.PublicMessage
+        self.boardEditor = self.publicEditor
+        self.round = 1
+        
+        await self.send_vote_panel(participant)
+        session_store.update_session(self.sessionId, board_message_id=self.boardMessage.id)
+        
+        self.spawn(self.update_tierboard())
+        self.spawn(self.prefetch_upcoming())
+    
+    async def prefetch_upcoming(self):
+        # While a round is open, load the next participants' members and avatar tiles
+        # so "Next Vote" and the following tierboard update never wait on the network
+        guild = self.PublicChannel.guild
+        urls = []
+        for participant_ID in islice(self.ParticipantArray, prefetch_ahead):
+            member = self._upcoming.get(participant_ID) or guild.get_member(participant_ID)
+            if member is None:
+                try:
+                    member = await guild.fetch_member(participant_ID)
+                except discord.HTTPException:
+                    continue
+            self._upcoming[participant_ID] = member
+            urls.append(avatar_url_for(member))
+        await self.renderer.prefetch_icons(urls)
+    
+    async def send_vote_panel(self, participant: discord.Member):
         self.votePanel = VotePanel(tiers=default_tiers)
         self.votePanel.add_avatar_exception(avatars_except)
         self.votePanel.set_stage_user(participant)
-        self.votePanel.create_vote_buttons(
-            cast_vote=self.cast_vote
-        )
+        self.votePanel.create_vote_buttons(self.sessionId, self.round)
         self.votePanel.set_footer(text="Voted: 0")
         
-        self.boardMessage = self.PublicMessage
-        
         self.PublicMessage = await self.PublicChannel.send(
             embed=self.votePanel,
             view=self.votePanel
         )
-        
-        create_task(self.update_tierboard())
+        self.publicEditor = EditScheduler(self.PublicMessage)
+        session_store.update_session(self.sessionId, public_message_id=self.PublicMessage.id,
+                                     stage_user_id=participant.id, round=self.round)
     
+    @metrics.timed("handler_seconds", handler="on_end_vote")
     async def on_end_vote(self, interaction: discord.Interaction):
+        self.touch()
         self.controlPanel.clear_items()
         self.status = "Voting completed."
         self.controlPanel.stop()
-        tasks = [self.PrivateMessage.edit(embed=self.controlPanel.embed, view=self.controlPanel),
+        # Drop queued edits of messages that are about to be deleted
+        self.publicEditor.cancel()
+        self.boardEditor.cancel()
+        tasks = [self.privateEditor.flush(embed=self.controlPanel.embed, view=self.controlPanel),
                  self.PublicMessage.delete(),
                  self.boardMessage.delete()
                  ]
@@ -214,59 +490,180 @@ class VoteControl:
         self.publicPanel.embed.description = "The final tier list standings based on votes."
         self.publicPanel.embed.color = 0xffd700  # Change embed color to gold
         self.publicPanel.embed.set_footer(text="Final Tier List")
-        self.publicPanel.embed.set_image(url="attachment://tierboard.png")
-        
+        self.publicPanel.embed.set_image(url=f"attachment://tierboard.{FINAL_ENCODING.extension}")
         
-        avatar_url = self.votePanel.stage_user.avatar.url if self.votePanel.stage_user.avatar else self.votePanel.stage_user.default_avatar.url
         
-        if self.votePanel.stage_user.id in avatars_except:
-            print("Using excepted avatar for", self.votePanel.stage_user.id)
-            avatar_url = avatars_except[self.votePanel.stage_user.id]
+        await self.run_exclusive(self._close_round)
+        analytics = load_analytics()
+        if analytics is not None:  # The final post just goes without stats when numpy is missing
+            with metrics.time("analytics_seconds"):
+                for name, value in analytics.analytics_fields(analytics.analyze(self.voteStore)):
+                    self.publicPanel.embed.add_field(name=name, value=value[:1024], inline=False)
+        session_store.end_session(self.sessionId)
         
-        self.renderer.add_item(
-                                avatar_url,
-                                self.Votes[self.votePanel.stage_user.id].calc_results()
-                                )
-        
-        img = self.renderer.render()
-        discord_file = File(fp=img, filename="tierboard.png")
+        await self.renderer.fetch_icons()
+        tiles = await render_executor.render_tiles(self.renderer, FINAL_ENCODING)
+        files = [File(fp=img, filename=f"tierboard{f'_{i + 1}' if i else ''}.{FINAL_ENCODING.extension}")
+                 for i, img in enumerate(tiles)]
 
-        create_task(self.PublicChannel.send(
-            embed=self.publicPanel.embed,
-            file=discord_file
-        ))
+        self.spawn(self.send_final_board(files))
 
         await gather(*tasks)
         
-        self.remove()
+        await self.remove()
 
-    async def cast_vote(self, interaction: discord.Interaction, tier: str):
-        if self.voteCounter.get_tier_vote_count(interaction.user.id, tier) >= default_limits.get(tier, float('inf')):
-            await interaction.followup.send(f"You have reached the vote limit for {tier}.", ephemeral=True)
-            return
+    async def send_final_board(self, files: list[File]):
+        # Oversized boards come split into several images, Discord takes 10 attachments per message
+        await self.PublicChannel.send(embed=self.publicPanel.embed, files=files[:10])
+        for i in range(10, len(files), 10):
+            await self.PublicChannel.send(files=files[i:i + 10])
 
-        if self.votePanel.stage_user.id not in self.Votes:
-            self.Votes[self.votePanel.stage_user.id] = VoteHandler(self.votePanel.stage_user, default_tiers)
+    async def on_component(self, interaction: discord.Interaction, round: int, action: str):
+        # Entry point from the component dispatcher, vote buttons carry a tier index, the others an action name
+        self.touch()
+        if action.isdigit():
+            await self.on_vote_click(interaction, int(action), round)
+            return
+        handler = {
+            COMPONENT_IDS.JOIN: self.on_join_button_click,
+            COMPONENT_IDS.PARTICIPANTS: self.on_check_participants,
+            COMPONENT_IDS.START_VOTE: self.on_start_vote,
+            COMPONENT_IDS.NEXT_VOTE: self.on_next_vote,
+            COMPONENT_IDS.END_VOTE: self.on_end_vote,
+        }.get(action)
+        if handler is None:
+            await reply(interaction, "This button is no longer in use.")
+            return
+        if action in (COMPONENT_IDS.START_VOTE, COMPONENT_IDS.NEXT_VOTE, COMPONENT_IDS.END_VOTE):
+            # Set before the first await, so a double click cannot run a phase change twice
+            if self._controlling or round != self.round:
+                await reply(interaction, "That click was already handled.")
+                return
+            self._controlling = True
+            try:
+                await handler(interaction)
+            finally:
+                self._controlling = False
+            return
+        await handler(interaction)
+    
+    async def on_vote_click(self, interaction: discord.Interaction, tier_index: int, round: int):
+        await defer(interaction)
+        if getattr(self, "votePanel", None) is None or tier_index >= len(default_tiers):
+            self.spawn(interaction.followup.send("This button is no longer in use.", ephemeral=True))
+            return
+        if round != self.round:  # A button from an earlier round's message, its stage user has moved on
+            metrics.inc("votes_stale_total")
+            self.spawn(interaction.followup.send("That round has already closed.", ephemeral=True))
+            return
+        if self.votePanel.stage_user.id == interaction.user.id:
+            self.spawn(interaction.followup.send("You cannot vote for yourself!", ephemeral=True))
+            return
+        await self.cast_vote(interaction, default_tiers[tier_index], round)  # Only enqueues, returns immediately
 
-        self.Votes[self.votePanel.stage_user.id].Tiers[interaction.user.id] = tier
-        self.votePanel.set_footer(text=f"Voted: {len(self.Votes[self.votePanel.stage_user.id].Tiers)}")
-        create_task(self.PublicMessage.edit(embed=self.votePanel))
-        create_task(interaction.followup.send(f"You voted {tier} for {self.votePanel.stage_user.name}!", ephemeral=True))
-        
-        return
+    @metrics.timed("handler_seconds", handler="cast_vote")
+    async def cast_vote(self, interaction: discord.Interaction, tier: str, round: int = None):
+        # Only queues the vote, the worker applies it; a full queue turns the click away instead of piling up
+        self.touch()
+        self._ensure_vote_worker()
+        try:
+            self.voteQueue.put_nowait(("vote", interaction, tier, self.round if round is None else round))
+        except QueueFull:
+            metrics.inc("votes_dropped_total")
+            self.spawn(interaction.followup.send("Voting is busy right now, please click again in a moment.", ephemeral=True))
+    
+    async def run_exclusive(self, func):
+        # Runs func on the vote worker, after every vote queued before it
+        self._ensure_vote_worker()
+        future = get_running_loop().create_future()
+        await self.voteQueue.put(("call", func, future))
+        return await future
+    
+    def _ensure_vote_worker(self):
+        if self._voteWorker is None or self._voteWorker.done():
+            self._voteWorker = self.spawn(self._vote_worker())
+    
+    async def _vote_worker(self):
+        # The only writer of vote and round state once voting has started
+        while True:
+            batch = [await self.voteQueue.get()]
+            while len(batch) < vote_batch_size and not self.voteQueue.empty():
+                batch.append(self.voteQueue.get_nowait())
+            
+            votes = []
+            for op in batch:
+                if op[0] == "vote":
+                    votes.append(op)
+                    continue
+                self._apply_votes(votes)
+                votes = []
+                _, func, future = op
+                try:
+                    future.set_result(func())
+                except Exception as e:
+                    future.set_exception(e)
+            self._apply_votes(votes)
+            
+            for _ in batch:
+                self.voteQueue.task_done()
     
-class VoteHandler:
-    def __init__(self, user: discord.User, tiers: list[str] = []):
+    def _apply_votes(self, votes: list[tuple]):
+        if not votes:
+            return
+        with metrics.time("vote_batch_seconds"):
+            metrics.observe("vote_batch_size", len(votes))
+            stage_user = self.votePanel.stage_user
+            if stage_user.id not in self.Votes:
+                self.Votes[stage_user.id] = VoteHandler(stage_user, default_tiers, self.voteStore)
+            handler = self.Votes[stage_user.id]
+            
+            applied = 0
+            for _, interaction, tier, round in votes:
+                if round != self.round:
+                    metrics.inc("votes_stale_total")
+                    self.spawn(interaction.followup.send("That round has already closed.", ephemeral=True))
+                    continue
+                # Vote limits count finished rounds only, so the counter is stable for the whole batch
+                if self.voteCounter.get_tier_vote_count(interaction.user.id, tier) >= default_limits.get(tier, float('inf')):
+                    metrics.inc("votes_rejected_total", tier=tier)
+                    self.spawn(interaction.followup.send(f"You have reached the vote limit for {tier}.", ephemeral=True))
+                    continue
+                
+                handler.set_vote(interaction.user.id, tier)
+                session_store.record_vote(self.sessionId, stage_user.id, interaction.user.id, tier)
+                self.spawn(interaction.followup.send(f"You voted {tier} for {stage_user.name}!", ephemeral=True))
+                applied += 1
+            
+            metrics.inc("votes_cast_total", applied)
+            if applied:
+                # One footer update and one coalesced edit per batch
+                self.votePanel.set_footer(text=f"Voted: {len(handler.Tiers)} | Leading: {handler.calc_results()}")
+                self.publicEditor.request(embed=self.votePanel)
+    
+class VoteHandler: # View over one subject's row of the VoteStore
+    def __init__(self, user: discord.User, tiers: list[str] = [], store: VoteStore = None):
         self.User = user
-        self.Tiers: dict[int, str] = dict()  # Dictionary to store votes {voter_id: tier}
+        self.Store = store if store is not None else VoteStore(tiers)
+        self.Tiers = SubjectVotes(self.Store, user.id)  # Read-only {voter_id: tier}
         self.TiersList = tiers  # List of possible tiers
+        self._result: str = None  # Cached winner, cleared whenever a vote changes
+    
+    @property
+    def Counts(self) -> dict[str, int]:
+        return self.Store.tier_counts(self.User.id)
+    
+    def set_vote(self, voter_id: int, tier: str):
+        self.Store.set_vote(self.User.id, voter_id, tier)
+        self._result = None
     
     def calc_results(self) -> str:
-        scores = []
-        
-        for tier in self.TiersList:
-            count = sum(1 for t in self.Tiers.values() if t == tier)
-            scores.append(count)
+        if self._result is None:
+            self._result = self._cascade()
+        return self._result
+    
+    def _cascade(self) -> str:
+        counts = self.Counts
+        scores = [counts.get(tier, 0) for tier in self.TiersList]
         
         if max(scores) == 0:
             return self.TiersList[-1]  # No votes cast, default to lowest tier
@@ -281,20 +678,25 @@ class VoteHandler:
         return self.TiersList[-1]  # Fallback to lowest tier(just in case)
 
 
-class VoteCounter: # Used for counting votes per user
-    def __init__(self):
-        self.counters: dict[int, dict[str, int]] = {}  # {user_id: {tier: count}}
+class VoteCounter: # Used for counting votes per user, view over the VoteStore's per-voter totals
+    def __init__(self, store: VoteStore = None):
+        self.Store = store if store is not None else VoteStore([])
+
+    @property
+    def counters(self) -> dict[int, dict[str, int]]:  # {user_id: {tier: count}}
+        return {uid: self.get_votes(uid) for uid in self.Store.voters}
 
     def add_vote(self, voter_id: int, tier: str):
-        if voter_id not in self.counters:
-            self.counters[voter_id] = {}
-        self.counters[voter_id][tier] = self.counters[voter_id].get(tier, 0) + 1
+        self.Store.add_voter_count(voter_id, tier)
+
+    def add_round(self, subject_id: int):
+        self.Store.count_round(subject_id)
 
     def get_votes(self, user_id: int) -> dict[str, int]:
-        return self.counters.get(user_id, {})
+        return {tier: count for tier in self.Store.tiers if (count := self.Store.voter_tier_count(user_id, tier))}
     
     def get_tier_vote_count(self, user_id: int, tier: str) -> int:
-        return self.get_votes(user_id).get(tier, 0)
+        return self.Store.voter_tier_count(user_id, tier)
     
     def __repr__(self):
-        return f"VoteCounter:\n" + "\n".join([f"User {uid}: {votes}" for uid, votes in self.counters.items()])
\ No newline at end of file
+        return f"VoteCounter:\n" + "\n".join([f"User {uid}: {votes}" for uid, votes in self.counters.items()])
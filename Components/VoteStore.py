@@ -0,0 +1,126 @@
+from array import array
+from collections.abc import Mapping
+
+
+NO_VOTE = -1
+
+
+class VoteStore:
+    # All votes of a session in one dense int8 matrix: row = subject, column = voter, value = tier index
+    # Participants and tiers are interned to small ints so no per-vote Python objects are kept
+    def __init__(self, tiers: list[str]):
+        self.tiers = list(tiers)
+        self.tier_index = {tier: i for i, tier in enumerate(self.tiers)}
+        if len(self.tiers) > 127:
+            raise ValueError("VoteStore supports at most 127 tiers")
+
+        self.subjects: list[int] = []  # Row index -> user id
+        self.subject_index: dict[int, int] = {}
+        self.voters: list[int] = []  # Column index -> user id
+        self.voter_index: dict[int, int] = {}
+
+        self._stride = 16  # Allocated columns per row, grows by doubling
+        self.matrix = array("b")  # len(subjects) * stride, NO_VOTE where nobody voted
+        self.subject_counts = array("i")  # len(subjects) * len(tiers), votes per tier per subject
+        self.subject_voted = array("i")  # Number of votes per subject
+        self.voter_counts = array("i")  # len(voters) * len(tiers), finished rounds per voter (VoteCounter)
+
+    def subject(self, user_id: int) -> int:
+        if user_id not in self.subject_index:
+            self.subject_index[user_id] = len(self.subjects)
+            self.subjects.append(user_id)
+            self.matrix.extend(array("b", [NO_VOTE]) * self._stride)
+            self.subject_counts.extend(array("i", [0]) * len(self.tiers))
+            self.subject_voted.append(0)
+        return self.subject_index[user_id]
+
+    def voter(self, user_id: int) -> int:
+        if user_id not in self.voter_index:
+            if len(self.voters) == self._stride:
+                self._grow()
+            self.voter_index[user_id] = len(self.voters)
+            self.voters.append(user_id)
+            self.voter_counts.extend(array("i", [0]) * len(self.tiers))
+        return self.voter_index[user_id]
+
+    def _grow(self):
+        old_stride, self._stride = self._stride, self._stride * 2
+        padding = array("b", [NO_VOTE]) * (self._stride - old_stride)
+        matrix = array("b")
+        for row in range(len(self.subjects)):
+            matrix.extend(self.matrix[row * old_stride:(row + 1) * old_stride])
+            matrix.extend(padding)
+        self.matrix = matrix
+
+    def set_vote(self, subject_id: int, voter_id: int, tier: str):
+        row, col, new = self.subject(subject_id), self.voter(voter_id), self.tier_index[tier]
+        cell = row * self._stride + col
+        old = self.matrix[cell]
+        if old == new:
+            return
+        counts = row * len(self.tiers)
+        if old == NO_VOTE:
+            self.subject_voted[row] += 1
+        else:
+            self.subject_counts[counts + old] -= 1  # A re-vote moves the count to the new tier
+        self.subject_counts[counts + new] += 1
+        self.matrix[cell] = new
+
+    def get_vote(self, subject_id: int, voter_id: int) -> str | None:
+        if subject_id not in self.subject_index or voter_id not in self.voter_index:
+            return None
+        value = self.matrix[self.subject_index[subject_id] * self._stride + self.voter_index[voter_id]]
+        return None if value == NO_VOTE else self.tiers[value]
+
+    def row(self, subject_id: int) -> array:
+        # Tier indexes for every known voter, NO_VOTE where they did not vote
+        row = self.subject(subject_id)
+        return self.matrix[row * self._stride:row * self._stride + len(self.voters)]
+
+    def tier_counts(self, subject_id: int) -> dict[str, int]:
+        row = self.subject(subject_id) * len(self.tiers)
+        return dict(zip(self.tiers, self.subject_counts[row:row + len(self.tiers)]))
+
+    def vote_count(self, subject_id: int) -> int:
+        return self.subject_voted[self.subject(subject_id)]
+
+    def count_round(self, subject_id: int):
+        # Adds a finished round's votes to every voter's per-tier totals
+        n = len(self.tiers)
+        for col, value in enumerate(self.row(subject_id)):
+            if value != NO_VOTE:
+                self.voter_counts[col * n + value] += 1
+
+    def add_voter_count(self, voter_id: int, tier: str):
+        self.voter_counts[self.voter(voter_id) * len(self.tiers) + self.tier_index[tier]] += 1
+
+    def voter_tier_count(self, voter_id: int, tier: str) -> int:
+        if voter_id not in self.voter_index or tier not in self.tier_index:
+            return 0
+        return self.voter_counts[self.voter_index[voter_id] * len(self.tiers) + self.tier_index[tier]]
+
+    def nbytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in (self.matrix, self.subject_counts, self.subject_voted, self.voter_counts))
+
+
+class SubjectVotes(Mapping):
+    # Read-only {voter_id: tier} view of one matrix row, so existing dict-style code keeps working
+    def __init__(self, store: VoteStore, subject_id: int):
+        self.store = store
+        self.subject_id = subject_id
+        store.subject(subject_id)
+
+    def __getitem__(self, voter_id: int) -> str:
+        tier = self.store.get_vote(self.subject_id, voter_id)
+        if tier is None:
+            raise KeyError(voter_id)
+        return tier
+
+    def __iter__(self):
+        voters = self.store.voters
+        for col, value in enumerate(self.store.row(self.subject_id)):
+            if value != NO_VOTE:
+                yield voters[col]
+
+    def __len__(self) -> int:
+        return self.store.vote_count(self.subject_id)
@@ -0,0 +1,137 @@
+"""Renders archived tier lists in parallel, for recap posts and exports.
+
+Tier lists come from JSON files, each holding one object or a list of them:
+    {"name": "march", "tiers": ["S", "A", "B"], "items": [["https://.../avatar.png", "S"], ...]}
+or from the session database.
+
+Run from the repository root:
+    python batch_render.py lists/*.json --out renders
+    python batch_render.py --db tiervoter.db --phase ended --out renders --workers 8
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+
+def load_json(paths: list[str]) -> list[dict]:
+    lists = []
+    for path in paths:
+        with open(path) as f:
+            data = json.load(f)
+        for i, entry in enumerate(data if isinstance(data, list) else [data]):
+            default = os.path.splitext(os.path.basename(path))[0] + (f"_{i + 1}" if isinstance(data, list) else "")
+            lists.append({
+                "name": str(entry.get("name") or default),
+                "tiers": list(entry["tiers"]),
+                "items": [(url, tier) for url, tier in entry["items"]],
+            })
+    return lists
+
+
+def load_sessions(db: str, session_ids: list[int], phase: str) -> list[dict]:
+    from Components.SessionStore import SessionStore
+    store = SessionStore(db)
+    lists = []
+    for session_id in session_ids or store.find_sessions(None if phase == "any" else phase):
+        saved = store.load_session(session_id)
+        if saved is None:
+            print(f"Session {session_id} not found in {db}", file=sys.stderr)
+            continue
+        lists.append({
+            "name": f"session_{session_id}",
+            "tiers": saved["tiers"],
+            "items": [(item["url"], item["tier"]) for item in saved["items"]],
+        })
+    store.close()
+    return lists
+
+
+def init_worker(font_path: str):
+    from Components.TemplateRenderer import TemplateRenderer
+    TemplateRenderer.font_path = font_path
+
+
+def render_job(tier_list: dict, out_dir: str, encoding) -> dict:
+    # Runs in a pool worker; icons were fetched up front, so this only reads the shared on-disk icon cache
+    from Components.TemplateRenderer import TemplateRenderer, RenderSnapshot
+    start = time.perf_counter()
+    snapshot = RenderSnapshot(tuple(tier_list["tiers"]), tuple(tuple(item) for item in tier_list["items"]))
+    tiles = TemplateRenderer(list(snapshot.tiers)).render_tiles(snapshot, encoding)
+    name = re.sub(r"[^\w.-]+", "_", tier_list["name"])
+    paths = []
+    for i, tile in enumerate(tiles):
+        path = os.path.join(out_dir, f"{name}{f'_{i + 1}' if i else ''}.{encoding.extension}")
+        with open(path, "wb") as f:
+            f.write(tile.getvalue())
+        paths.append(path)
+    return {"name": tier_list["name"], "paths": paths, "bytes": sum(os.path.getsize(p) for p in paths),
+            "seconds": time.perf_counter() - start}
+
+
+async def prefetch(lists: list[dict]):
+    from Components.TemplateRenderer import TemplateRenderer
+    from Components.IconFetcher import icon_fetcher
+    urls = list(dict.fromkeys(url for tier_list in lists for url, _ in tier_list["items"]))
+    await TemplateRenderer([]).prefetch_icons(urls)
+    await icon_fetcher.close()
+    return len(urls)
+
+
+def main(args):
+    if args.icon_cache:
+        os.environ["TIERVOTER_ICON_CACHE"] = args.icon_cache  # Read at import, workers inherit it
+    from Components.TemplateRenderer import TemplateRenderer, FINAL_ENCODING, EncodeProfile
+
+    lists = load_json(args.inputs) if args.inputs else []
+    if args.db:
+        lists += load_sessions(args.db, args.session, args.phase)
+    if not lists:
+        print("Nothing to render, pass JSON files or --db", file=sys.stderr)
+        return 1
+    if args.font:
+        TemplateRenderer.font_path = args.font
+    encoding = FINAL_ENCODING if args.format == "png" else EncodeProfile(format="WEBP", lossless=True, quality=80, method=4)
+    os.makedirs(args.out, exist_ok=True)
+
+    start = time.perf_counter()
+    icons = asyncio.run(prefetch(lists))
+    fetch_s = time.perf_counter() - start
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(TemplateRenderer.font_path,)) as pool:
+        futures = [pool.submit(render_job, tier_list, args.out, encoding) for tier_list in lists]
+        for future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Render failed: {e}", file=sys.stderr)
+                continue
+            results.append(result)
+            print(f"{result['name']}: {len(result['paths'])} image(s), {result['bytes'] / 1024:.1f} KiB, {result['seconds'] * 1000:.0f} ms")
+    render_s = time.perf_counter() - start
+
+    items = sum(len(tier_list["items"]) for tier_list in lists)
+    print(f"Rendered {len(results)}/{len(lists)} tier lists ({items} items, {icons} unique icons) in {render_s:.2f}s "
+          f"with {args.workers or os.cpu_count()} workers: {len(results) / render_s:.1f} lists/s, {items / render_s:.0f} items/s, "
+          f"icon fetch {fetch_s:.2f}s")
+    return 0 if len(results) == len(lists) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render many tier lists in parallel")
+    parser.add_argument("inputs", nargs="*", help="JSON files with tier lists")
+    parser.add_argument("--db", help="session database to read tier lists from")
+    parser.add_argument("--session", type=int, action="append", help="session id to render, repeatable, default every session")
+    parser.add_argument("--phase", default="ended", help="with --db and no --session, only sessions in this phase, 'any' for all (default ended)")
+    parser.add_argument("--out", default="renders", help="output directory")
+    parser.add_argument("--format", choices=("png", "webp"), default="png")
+    parser.add_argument("--workers", type=int, help="render processes, default one per CPU")
+    parser.add_argument("--icon-cache", help="icon cache directory shared by the workers")
+    parser.add_argument("--font", help="TrueType font to use instead of arial.ttf")
+    sys.exit(main(parser.parse_args()))
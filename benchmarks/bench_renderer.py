@@ -0,0 +1,230 @@
+"""Benchmarks TemplateRenderer against a local stand-in for the Discord CDN.
+
+Run from the repository root:
+    python -m benchmarks.bench_renderer --output bench_results.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import atexit
+import argparse
+import resource
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# The icon cache reads its directory at import time. Every importing process (case workers, the simulator)
+# gets a directory of its own, even if TIERVOTER_ICON_CACHE is set: cold cases clear it
+BENCH_ICON_CACHE = os.environ["TIERVOTER_ICON_CACHE"] = tempfile.mkdtemp(prefix="tiervoter-bench-")
+atexit.register(shutil.rmtree, BENCH_ICON_CACHE, ignore_errors=True)
+
+from PIL import Image, ImageDraw
+from Components.TemplateRenderer import TemplateRenderer, LIVE_ENCODING, FINAL_ENCODING
+from Components.IconCache import icon_cache
+from Components.IconFetcher import icon_fetcher
+from Components.Metrics import metrics
+
+
+TIER_SETS = {
+    3: ["S", "A", "B"],
+    7: ["Maid", "S", "A", "B", "C", "D", "E"],
+    12: ["SS", "S+", "S", "A+", "A", "B+", "B", "C", "D", "E", "F", "No life"],
+}
+
+
+def make_avatar(n: int, size: int) -> bytes:
+    # Deterministic noisy avatar so encoders see something closer to a real photo than a flat colour
+    rng = random.Random(n)
+    img = Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, y0 = rng.randrange(size), rng.randrange(size)
+        draw.ellipse([x0, y0, x0 + rng.randrange(20, size), y0 + rng.randrange(20, size)],
+                     fill=tuple(rng.randrange(256) for _ in range(3)))
+    img = Image.blend(img, Image.effect_noise((size, size), 40).convert("RGB"), 0.25)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class AvatarServer:
+    # Serves /avatar/<n>.png, generated once and kept in memory
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self._avatars: dict[int, bytes] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                try:
+                    n = int(self.path.rsplit("/", 1)[-1].split(".")[0])
+                except ValueError:
+                    self.send_error(404)
+                    return
+                with server._lock:
+                    server.requests += 1
+                    if n not in server._avatars:
+                        server._avatars[n] = make_avatar(n, server.size)
+                    data = server._avatars[n]
+                if server.latency:
+                    time.sleep(server.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def prepare(self, ids):
+        # Generate outside the timed section so the stand-in measures transfer, not image synthesis
+        for n in ids:
+            if n not in self._avatars:
+                self._avatars[n] = make_avatar(n, self.size)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+
+
+def max_rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def rss_kb() -> int:
+    # Current resident set, Pillow's image buffers included unlike tracemalloc
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        return max_rss_kb()
+
+
+async def bench_case(url: str, participants: int, tier_count: int, cache: str, rounds: int) -> dict:
+    tiers = TIER_SETS[tier_count]
+    rng = random.Random(participants * 31 + tier_count)
+    items = [(f"{url}/avatar/{n}.png", rng.choice(tiers)) for n in range(participants)]
+
+    if cache == "cold":
+        icon_cache.clear()
+    else:
+        # Warm the shared cache with a throwaway renderer first
+        warm = TemplateRenderer(tiers)
+        warm.items = [list(item) for item in items]
+        await warm.fetch_icons()
+
+    requests_before = metrics.counters.get(("icon_fetches_total",), 0)
+    rss_before = rss_kb()
+    renderer = TemplateRenderer(tiers)
+    renderer.items = [list(item) for item in items]
+
+    start = time.perf_counter()
+    await renderer.fetch_icons()
+    fetch_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    renderer.render(encoding=LIVE_ENCODING)
+    full_render_s = time.perf_counter() - start
+
+    # Per round cost: one new item, one incremental render, as on_next_vote does
+    round_times = []
+    for n in range(participants, participants + rounds):
+        renderer.add_item(f"{url}/avatar/{n}.png", rng.choice(tiers))
+        await renderer.fetch_icons()
+        start = time.perf_counter()
+        renderer.render(encoding=LIVE_ENCODING)
+        round_times.append(time.perf_counter() - start)
+
+    output = {}
+    for name, encoding in (("live", LIVE_ENCODING), ("final", FINAL_ENCODING)):
+        start = time.perf_counter()
+        size = len(renderer.encode(encoding).getvalue())
+        output[name] = {"bytes": size, "encode_s": time.perf_counter() - start}
+    await icon_fetcher.close()
+
+    round_times.sort()
+    return {
+        "participants": participants,
+        "tiers": tier_count,
+        "cache": cache,
+        "fetch_s": fetch_s,
+        "http_requests": int(metrics.counters.get(("icon_fetches_total",), 0) - requests_before),
+        "full_render_s": full_render_s,
+        "round_render_mean_s": sum(round_times) / len(round_times) if round_times else None,
+        "round_render_p95_s": round_times[int(len(round_times) * 0.95)] if round_times else None,
+        "canvas": list(renderer._canvas.size),
+        "canvas_bytes": len(renderer._canvas.getbands()) * renderer._canvas.width * renderer._canvas.height,
+        # Peak above the process before the measured renderer, only meaningful because every case gets a fresh process
+        "peak_rss_delta_kb": max(0, max_rss_kb() - rss_before),
+        "output": output,
+    }
+
+
+def run_case(url: str, participants: int, tier_count: int, cache: str, rounds: int, font: str) -> dict:
+    # Runs in its own process, so the process-wide peak RSS belongs to this case alone
+    metrics.enabled = True  # Counts the icon downloads
+    if font:
+        TemplateRenderer.font_path = font
+    return asyncio.run(bench_case(url, participants, tier_count, cache, rounds))
+
+
+def main(args):
+    results = []
+    spawn = multiprocessing.get_context("spawn")
+    with AvatarServer(latency=args.latency) as server:
+        for participants in args.participants:
+            server.prepare(range(participants + args.rounds))
+            for tier_count in args.tiers:
+                for cache in args.cache:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                        result = pool.submit(run_case, server.url, participants, tier_count, cache, args.rounds, args.font).result()
+                    results.append(result)
+                    print(f"{participants:>5} items {tier_count:>2} tiers {cache:<4} | "
+                          f"fetch {result['fetch_s'] * 1000:8.1f} ms | full {result['full_render_s'] * 1000:8.1f} ms | "
+                          f"round {result['round_render_mean_s'] * 1000:6.1f} ms | "
+                          f"live {result['output']['live']['bytes'] / 1024:7.1f} KiB | final {result['output']['final']['bytes'] / 1024:7.1f} KiB | "
+                          f"peak +{result['peak_rss_delta_kb'] / 1024:6.1f} MiB")
+
+    report = {
+        "python": sys.version.split()[0],
+        "render_mode": "inline",
+        "isolation": "process per case",
+        "item_size": TemplateRenderer.item_size,
+        "items_per_row": TemplateRenderer.items_per_row,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark TemplateRenderer with a local avatar server")
+    parser.add_argument("--participants", type=int, nargs="+", default=[10, 50, 100, 250, 500, 1000])
+    parser.add_argument("--tiers", type=int, nargs="+", choices=sorted(TIER_SETS), default=[3, 7, 12])
+    parser.add_argument("--cache", nargs="+", choices=["cold", "warm"], default=["cold", "warm"])
+    parser.add_argument("--rounds", type=int, default=20, help="incremental rounds measured after the full render")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the avatar server waits per request")
+    parser.add_argument("--font", help="TrueType font to use instead of arial.ttf")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+    main(args)
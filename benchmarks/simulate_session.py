@@ -0,0 +1,254 @@
+"""Drives full VoteControl sessions with in-process fake Discord objects.
+
+Run from the repository root:
+    python -m benchmarks.simulate_session --channels 4 --participants 30 --voters 500
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from itertools import count
+from types import SimpleNamespace
+
+# Keep the simulation's database and icon tiles away from the bot's
+os.environ.setdefault("TIERVOTER_DB", os.path.join(tempfile.mkdtemp(prefix="tiervoter-sim-"), "sim.db"))
+
+from benchmarks.bench_renderer import AvatarServer
+from Components.VoteControl import VoteControl
+from Components.Dispatcher import component_dispatcher
+from Components.IconFetcher import icon_fetcher
+from Components.RenderExecutor import render_executor
+from Components.SessionStore import session_store
+from Components.Metrics import metrics
+
+
+_ids = count(10**17)
+
+
+class Stats:
+    def __init__(self):
+        self.latency: dict[str, list[float]] = {}
+        self.edits: dict[str, int] = {}
+        self.sends = 0
+        self.loop_lag: list[float] = []
+        self.edit_latency = 0.0
+
+    def record(self, handler: str, seconds: float):
+        self.latency.setdefault(handler, []).append(seconds)
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+    pick = lambda p: values[min(len(values) - 1, int(len(values) * p))]
+    return {"count": len(values), "p50_ms": pick(0.5) * 1000, "p95_ms": pick(0.95) * 1000,
+            "p99_ms": pick(0.99) * 1000, "max_ms": values[-1] * 1000}
+
+
+class FakeMessage:
+    def __init__(self, stats: Stats, channel: "FakeChannel", kind: str):
+        self.id = next(_ids)
+        self.stats = stats
+        self.channel = channel
+        self.guild = channel.guild
+        self.kind = kind
+
+    async def edit(self, **kwargs):
+        self.stats.edits[self.kind] = self.stats.edits.get(self.kind, 0) + 1
+        await asyncio.sleep(self.stats.edit_latency)  # A real edit is a network round trip, at least yield
+        return self
+
+    async def delete(self):
+        self.channel.messages.pop(self.id, None)
+
+
+class FakeChannel:
+    def __init__(self, stats: Stats, guild: "FakeGuild", kind: str = "public"):
+        self.id = next(_ids)
+        self.stats = stats
+        self.guild = guild
+        self.kind = kind
+        self.messages: dict[int, FakeMessage] = {}
+
+    async def send(self, *args, **kwargs) -> FakeMessage:
+        self.stats.sends += 1
+        message = FakeMessage(self.stats, self, self.kind)
+        self.messages[message.id] = message
+        return message
+
+    async def fetch_message(self, message_id: int) -> FakeMessage:
+        return self.messages[message_id]
+
+
+class FakeMember:
+    def __init__(self, stats: Stats, guild: "FakeGuild", avatar_url: str):
+        self.id = next(_ids)
+        self.name = f"user{self.id % 100000}"
+        self.avatar = None
+        self.default_avatar = SimpleNamespace(url=avatar_url)
+        self._dm = FakeChannel(stats, guild, kind="private")
+
+    async def send(self, *args, **kwargs) -> FakeMessage:
+        return await self._dm.send(*args, **kwargs)
+
+
+class FakeGuild:
+    def __init__(self):
+        self.id = next(_ids)
+        self.members: dict[int, FakeMember] = {}
+
+    def get_member(self, user_id: int) -> FakeMember:
+        return self.members.get(user_id)
+
+
+class FakeResponse:
+    def __init__(self):
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, *args, **kwargs):
+        self._done = True
+
+    async def defer(self, *args, **kwargs):
+        self._done = True
+
+
+class FakeFollowup:
+    async def send(self, *args, **kwargs):
+        await asyncio.sleep(0)
+
+
+class FakeInteraction:
+    def __init__(self, user: FakeMember, channel: FakeChannel, custom_id: str = None):
+        self.user = user
+        self.channel = channel
+        self.guild = channel.guild
+        self.data = {"custom_id": custom_id} if custom_id else {}
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+
+async def click(button, interaction: FakeInteraction):
+    # What the bot's on_interaction does for a component click
+    interaction.data = {"custom_id": button.custom_id}
+    await component_dispatcher.dispatch(interaction)
+
+
+def timed(stats: Stats, name: str, func):
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            stats.record(name, time.perf_counter() - start)
+    return wrapper
+
+
+async def monitor_loop_lag(stats: Stats, interval: float = 0.01):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        stats.loop_lag.append(max(0.0, loop.time() - start - interval))
+
+
+async def settle():
+    # Let fire-and-forget tasks spawned by the handlers run
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def run_session(stats: Stats, server: AvatarServer, participants: int, voters: int, seed: int):
+    rng = random.Random(seed)
+    guild = FakeGuild()
+    channel = FakeChannel(stats, guild)
+    members = [FakeMember(stats, guild, f"{server.url}/avatar/{rng.randrange(10**6)}.png") for _ in range(max(participants, voters))]
+    for member in members:
+        guild.members[member.id] = member
+    host = members[0]
+
+    vc = VoteControl(channel, host)
+    vc.cast_vote = timed(stats, "cast_vote", vc.cast_vote)
+    await vc.start()
+
+    join = timed(stats, "on_join_button_click", vc.on_join_button_click)
+    await asyncio.gather(*(join(FakeInteraction(member, channel)) for member in members[:participants]))
+    await settle()
+
+    await timed(stats, "on_start_vote", vc.on_start_vote)(FakeInteraction(host, channel))
+    vote_click = timed(stats, "dispatch", click)
+    next_vote = timed(stats, "on_next_vote", vc.on_next_vote)
+
+    for round_no in range(participants):
+        buttons = list(vc.votePanel.children)
+        clicks = [vote_click(rng.choice(buttons), FakeInteraction(member, channel))
+                  for member in rng.sample(members[:voters], k=voters)]
+        await asyncio.gather(*clicks)
+        await settle()
+        if round_no < participants - 1:
+            await next_vote(FakeInteraction(host, channel))
+            await settle()
+
+    await timed(stats, "on_end_vote", vc.on_end_vote)(FakeInteraction(host, channel))
+
+
+async def main(args):
+    stats = Stats()
+    stats.edit_latency = args.edit_latency
+    lag_task = asyncio.create_task(monitor_loop_lag(stats))
+    start = time.perf_counter()
+    with AvatarServer() as server:
+        await asyncio.gather(*(run_session(stats, server, args.participants, args.voters, seed)
+                               for seed in range(args.channels)))
+        # Give coalesced edits a chance to land before counting them
+        await asyncio.sleep(args.edit_grace)
+    elapsed = time.perf_counter() - start
+    lag_task.cancel()
+    await icon_fetcher.close()
+    render_executor.shutdown()
+    session_store.close()
+
+    clicks = args.channels * args.participants * args.voters
+    report = {
+        "python": sys.version.split()[0],
+        "channels": args.channels,
+        "participants": args.participants,
+        "voters": args.voters,
+        "elapsed_s": elapsed,
+        "clicks": clicks,
+        "clicks_per_s": clicks / elapsed,
+        "handlers": {name: percentiles(values) for name, values in stats.latency.items()},
+        "loop_lag": percentiles(stats.loop_lag),
+        "message_edits": stats.edits,
+        "edits_per_click": sum(stats.edits.values()) / clicks if clicks else 0,
+        "messages_sent": stats.sends,
+    }
+    if metrics.enabled:
+        report["metrics"] = metrics.snapshot()
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate tier list sessions with fake Discord objects")
+    parser.add_argument("--channels", type=int, default=2, help="sessions running at once")
+    parser.add_argument("--participants", type=int, default=20, help="participants per session, one round each")
+    parser.add_argument("--voters", type=int, default=200, help="members clicking a vote button every round")
+    parser.add_argument("--edit-grace", type=float, default=1.5, help="seconds to wait for scheduled edits at the end")
+    parser.add_argument("--edit-latency", type=float, default=0.0, help="seconds each fake message edit takes")
+    parser.add_argument("--font", help="TrueType font to use instead of arial.ttf")
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+    if args.font:
+        from Components.TemplateRenderer import TemplateRenderer
+        TemplateRenderer.font_path = args.font
+    asyncio.run(main(args))
@@ -1,13 +1,38 @@
+import time
+started = time.perf_counter()
+
 import discord
 from discord import app_commands
 from discord.ext import commands
-from Components.VoteControl import VoteControl
+from Components.VoteControl import VoteControl, prewarm
+from Components.SessionStore import session_store
+from Components.Metrics import metrics, start_metrics_server
+from Components.SessionManager import session_manager
+from Components.VoteStore import VoteStore
+from Components.Coordinator import coordinator, worker_id
+from Components.Dispatcher import component_dispatcher
+from Components.IconFetcher import icon_fetcher
+import asyncio
 import sqlite3
+import hashlib
+import json
+import os
+import sys
+import subprocess
+
+imported = time.perf_counter()
+sync_state_path = os.environ.get("TIERVOTER_SYNC_STATE", os.path.join(".cache", "command_sync.json"))
 
 intents = discord.Intents.default()
 intents.members = True
 token = open("token.txt", "r").read().strip()
-bot = discord.Client(intents=intents)
+workers = int(os.environ.get("TIERVOTER_WORKERS", 1))  # Bot processes, more than one runs the sharded mode
+shard_ids = [int(s) for s in os.environ["TIERVOTER_SHARD_IDS"].split(",")] if "TIERVOTER_SHARD_IDS" in os.environ else None
+if shard_ids is not None:
+    # A shard worker started by run_shard_workers, only receives the guilds of its shards
+    bot = discord.AutoShardedClient(intents=intents, shard_ids=shard_ids, shard_count=int(os.environ["TIERVOTER_SHARD_COUNT"]))
+else:
+    bot = discord.Client(intents=intents)
 tree = app_commands.CommandTree(bot)
 
 
@@ -18,7 +43,8 @@ async def ping(interaction: discord.Interaction):
 @tree.command(name="voteregister", description="Send a register view") # Command to register in tier list voting
 @commands.has_permissions(administrator=True)
 async def voteregister(interaction: discord.Interaction):
-    if interaction.channel.id in VoteControl.channel.keys():
+    if (interaction.channel.id in VoteControl.channel.keys()
+            or not await asyncio.to_thread(coordinator.claim, interaction.channel.id, worker_id)):
         await interaction.response.send_message(
             "A registration is already active in this channel.",
             ephemeral=True
@@ -35,10 +61,204 @@ async def voteregister(interaction: discord.Interaction):
         ephemeral=True
     )
 
+
+@tree.command(name="voteresume", description="Resume an unfinished tier list vote in this channel")
+@app_commands.default_permissions(administrator=True)  # Enforced by Discord, ext.commands checks do not apply to app commands
+async def voteresume(interaction: discord.Interaction):
+    if (interaction.channel.id in VoteControl.channel.keys()
+            or not await asyncio.to_thread(coordinator.claim, interaction.channel.id, worker_id)):
+        await interaction.response.send_message(
+            "A registration is already active in this channel.",
+            ephemeral=True
+        )
+        return
+    
+    session_id = await asyncio.to_thread(session_store.find_active, interaction.channel.id)
+    if session_id is None:
+        await asyncio.to_thread(coordinator.release, interaction.channel.id, worker_id)
+        await interaction.response.send_message("There is no unfinished session in this channel.", ephemeral=True)
+        return
+    
+    await interaction.response.defer(ephemeral=True)
+    saved = await asyncio.to_thread(session_store.load_session, session_id)
+    host = interaction.guild.get_member(saved["host_id"]) or interaction.user
+    await VoteControl.resume(interaction.channel, host, saved)
+    await interaction.followup.send("Session resumed! Check your DMs for the control panel.", ephemeral=True)
+
+
+@tree.command(name="votemetrics", description="Show bot performance metrics")
+@app_commands.default_permissions(administrator=True)  # Enforced by Discord, ext.commands checks do not apply to app commands
+async def votemetrics(interaction: discord.Interaction):
+    if not metrics.enabled:
+        await interaction.response.send_message("Metrics are disabled, start the bot with TIERVOTER_METRICS=1.", ephemeral=True)
+        return
+    await interaction.response.send_message(f"```\n{metrics.summary()[:1900]}\n```", ephemeral=True)
+
+
+@tree.command(name="votestats", description="Show voter agreement, controversy and voter bias for a tier list vote")
+@app_commands.describe(session_id="Session to analyse, defaults to the running or latest one in this channel")
+async def votestats(interaction: discord.Interaction, session_id: str = None):
+    try:
+        from Components.Analytics import analyze, analytics_fields
+    except ImportError:
+        await interaction.response.send_message("Vote statistics need numpy installed.", ephemeral=True)
+        return
+    
+    if session_id is not None and not session_id.isdigit():  # Snowflake ids overflow Discord's integer option
+        await interaction.response.send_message("Session ids are numbers.", ephemeral=True)
+        return
+    
+    live = VoteControl.channel.get(interaction.channel.id)
+    if session_id is None and live is not None:
+        store, title = live.voteStore, "Tier List Voting - Statistics so far"
+    else:
+        await interaction.response.defer(ephemeral=True)
+        if session_id is None:
+            ids = await asyncio.to_thread(session_store.find_sessions, None, interaction.channel.id)
+            session_id = ids[-1] if ids else None
+        saved = await asyncio.to_thread(session_store.load_session, int(session_id)) if session_id is not None else None
+        if saved is None or saved["guild_id"] != interaction.guild_id:  # Other servers' votes stay private
+            await interaction.followup.send("No tier list vote found to analyse.", ephemeral=True)
+            return
+        store = VoteStore(saved["tiers"])
+        for subject_id, voter_id, tier in saved["votes"]:
+            store.set_vote(subject_id, voter_id, tier)
+        title = "Tier List Voting - Statistics"
+    
+    fields = analytics_fields(analyze(store))
+    embed = discord.Embed(title=title, color=0xffd700)
+    for name, value in fields:
+        embed.add_field(name=name, value=value[:1024], inline=False)
+    if not fields:
+        embed.description = "Not enough votes yet."
+    if interaction.response.is_done():
+        await interaction.followup.send(embed=embed, ephemeral=True)
+    else:
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+@tree.command(name="votesessions", description="Show live tier list sessions and their memory use")
+@app_commands.default_permissions(administrator=True)  # Enforced by Discord, ext.commands checks do not apply to app commands
+async def votesessions(interaction: discord.Interaction):
+    text = session_manager.summary()
+    if shard_ids is not None:
+        shared = await asyncio.to_thread(coordinator.stats)
+        totals = shared["totals"]
+        text = (f"All {len(shared['workers'])} workers: {totals.get('sessions', 0)} sessions, {totals.get('tasks', 0)} tasks, "
+                f"~{totals.get('memory_bytes', 0) / 1024:.0f} KiB\nWorker {worker_id}, shards {shard_ids}:\n{text}")
+    await interaction.response.send_message(f"```\n{text[:1900]}\n```", ephemeral=True)
+
+
+async def report_stats(interval: float = 15):
+    # Lets the coordinator total up sessions across shard workers
+    while True:
+        await asyncio.to_thread(coordinator.report, worker_id, session_manager.stats())
+        await asyncio.sleep(interval)
+
     
+def command_tree_hash() -> str:
+    payload = [command.to_dict(tree) for command in tree.get_commands()]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+async def sync_commands() -> bool:
+    # Syncing is a slow, rate limited round trip, skip it unless the commands changed since the last sync
+    digest = command_tree_hash()
+    key = str(bot.application_id)
+    try:
+        with open(sync_state_path) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        state = {}
+    if state.get(key) == digest and os.environ.get("TIERVOTER_FORCE_SYNC") != "1":
+        return False
+    await tree.sync()
+    state[key] = digest
+    os.makedirs(os.path.dirname(sync_state_path) or ".", exist_ok=True)
+    with open(sync_state_path, "w") as f:
+        json.dump(state, f)
+    return True
+
+
+@bot.event
+async def setup_hook():
+    # Runs once per process after login, unlike on_ready which fires again on every reconnect
+    start = time.perf_counter()
+    synced = worker_id == 0 and await sync_commands()  # Commands are global, one shard worker syncs them
+    bot.sync_report = f"command sync {time.perf_counter() - start:.2f}s" if synced else "command sync skipped"
+    session_manager.start()
+    if metrics.enabled:
+        bot.metrics_server = await start_metrics_server(int(os.environ.get("TIERVOTER_METRICS_PORT", 9108)) + worker_id)
+    asyncio.create_task(prewarm())
+    asyncio.create_task(report_stats())
+    if shard_ids is not None:
+        asyncio.create_task(component_dispatcher.receive_forwarded(bot))
+
+
+@bot.event
+async def on_interaction(interaction: discord.Interaction):
+    # Buttons of every session, slash commands are handled by the tree
+    if interaction.type == discord.InteractionType.component:
+        await component_dispatcher.dispatch(interaction)
+
+
 @bot.event
 async def on_ready():
-    await tree.sync()
+    if not hasattr(bot, "ready_at"):
+        bot.ready_at = time.perf_counter()
+        metrics.set("startup_seconds", bot.ready_at - started)
+        print(f"Started in {bot.ready_at - started:.2f}s: imports {imported - started:.2f}s, {bot.sync_report}")
     print(f'We have logged in as {bot.user}')
 
-bot.run(token)
\ No newline at end of file
+async def run_bot():
+    # bot.run() closes its loop before returning, the icon fetcher's HTTP session has to be closed inside it
+    async with bot:
+        try:
+            await bot.start(token)
+        finally:
+            await icon_fetcher.close()
+
+
+def run_shard_workers(workers: int, shard_count: int):
+    # Sharded mode: one bot process per group of shards, sharing nothing but the database and icon cache
+    # This process only runs the coordinator and restarts nothing, a worker that exits just gives up its channels
+    from Components.Coordinator import serve
+    authkey = os.urandom(16)
+    manager = serve(authkey)
+    shared = manager.coordinator()
+    processes = {}
+    for worker in range(workers):
+        env = dict(os.environ,
+                   TIERVOTER_SHARD_IDS=",".join(str(shard) for shard in range(worker, shard_count, workers)),
+                   TIERVOTER_SHARD_COUNT=str(shard_count),
+                   TIERVOTER_WORKER_ID=str(worker),
+                   TIERVOTER_COORDINATOR=f"{manager.address[0]}:{manager.address[1]}",
+                   TIERVOTER_COORDINATOR_KEY=authkey.hex())
+        processes[worker] = subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env)
+    try:
+        while processes:
+            for worker, process in list(processes.items()):
+                if process.poll() is not None:
+                    print(f"Shard worker {worker} exited with code {process.returncode}")
+                    shared.drop_worker(worker)
+                    del processes[worker]
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.wait()
+    finally:
+        manager.shutdown()
+
+
+if workers > 1 and shard_ids is None:
+    run_shard_workers(workers, max(workers, int(os.environ.get("TIERVOTER_SHARDS", workers))))
+else:
+    discord.utils.setup_logging()  # What bot.run() would set up
+    try:
+        asyncio.run(run_bot())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        session_store.close()  # The writer is a daemon thread, commit what it still holds before exiting
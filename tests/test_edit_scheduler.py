@@ -0,0 +1,50 @@
+import asyncio
+import unittest
+from Components.EditScheduler import EditScheduler
+
+
+class SlowMessage:
+    # Stands in for discord.Message, every edit takes a network round trip
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.sent: list[dict] = []
+
+    async def edit(self, **kwargs):
+        self.sent.append(kwargs)
+        await asyncio.sleep(self.latency)
+
+
+class EditSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_request_during_edit_is_sent(self):
+        message = SlowMessage(0.2)
+        scheduler = EditScheduler(message, min_interval=0)
+        scheduler.request(embed=1)
+        await asyncio.sleep(0.05)  # The first edit is in flight
+        scheduler.request(embed=2)
+        await asyncio.sleep(0.5)
+        self.assertEqual(message.sent, [{"embed": 1}, {"embed": 2}])
+        self.assertEqual(scheduler._pending, {})
+
+    async def test_requests_coalesce_latest_wins(self):
+        message = SlowMessage(0)
+        scheduler = EditScheduler(message, min_interval=0.1)
+        scheduler.request(embed=1)
+        await asyncio.sleep(0.01)
+        scheduler.request(embed=2, view=1)
+        scheduler.request(embed=3)
+        await asyncio.sleep(0.3)
+        self.assertEqual(message.sent, [{"embed": 1}, {"embed": 3, "view": 1}])
+
+    async def test_flush_skips_the_wait(self):
+        message = SlowMessage(0)
+        scheduler = EditScheduler(message, min_interval=10)
+        scheduler.request(embed=1)
+        await asyncio.sleep(0.01)
+        scheduler.request(embed=2)
+        await scheduler.flush(view=1)
+        self.assertEqual(message.sent, [{"embed": 1}, {"embed": 2, "view": 1}])
+        scheduler.cancel()
+
+
+if __name__ == "__main__":
+    unittest.main()